@@ -1,12 +1,23 @@
 import streamlit as st
 import pandas as pd
 from data_fetcher import fetch_data
-from indicator_engine import get_indicators
+from timeframes import TimeframePyramid
+from indicator_engine import get_indicators_many, data_fingerprint, indicator_cache
 from backtest_engine import backtest
-from visualisation import plot_equity_curve, plot_all_indicators, plot_pnl_histogram
+from monte_carlo import monte_carlo
+from visualisation import plot_equity_curve, plot_all_indicators, plot_pnl_histogram, plot_param_heatmap
 from indicator_config import indicators_list as indicators_config
-from optimiser import bayesian_optimiser
+from optimiser import bayesian_optimiser, grid_optimiser, walk_forward_optimiser
+from strategy_compiler import compile_expr, conditions_to_expr
+from profiling import StageTimer, timed
 import uuid
+import os
+import tempfile
+
+
+GRID_METRICS = ["total_return", "CAGR", "sharpe_ratio", "num_trades", "win_percentage", "max_drawdown", "sortino", "calmar"]
+
+MONTE_CARLO_METHODS = {"Off": None, "Trade shuffle": "shuffle", "Trade bootstrap": "bootstrap", "Block bootstrap (bar returns)": "block"}
 
 
 
@@ -45,15 +56,49 @@ def build_strategy_conditions(df, key_prefix):
 
     st.session_state[f"{key_prefix}_conditions"] = new_conditions
 
-    expressions = []
-    for cond in new_conditions:
-        right_expr = f"df['{cond['right']}']" if cond['right'] in df.columns else cond['right']
-        expressions.append(f"(df['{cond['left']}'] {cond['op']} {right_expr})")
+    return conditions_to_expr(new_conditions, df.columns)
+
+
+# Each stage below is cached on the fingerprint of the fetched frame plus the
+# inputs it depends on, so a rerun only recomputes stages whose inputs
+# changed (e.g. a new stop loss reruns the backtest but reuses the signals).
+# `_df` is not hashed by Streamlit; the fingerprint stands in for it. Cached
+# objects are shared across reruns and must not be mutated.
+@st.cache_resource(max_entries=16, show_spinner=False)
+def cached_signals(fingerprint, long_expr, short_expr, exit_expr, _df):
+    with timed("app.signals"):
+        return tuple(compile_expr(expr).validate(_df.columns)(_df) for expr in (long_expr, short_expr, exit_expr))
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def cached_backtest(fingerprint, long_expr, short_expr, exit_expr, stop_loss_pct, take_profit_pct, _df):
+    long_signal, short_signal, exit_signal = cached_signals(fingerprint, long_expr, short_expr, exit_expr, _df)
+    with timed("app.backtest"):
+        return backtest(_df, long_signal, short_signal, exit_signal, stop_loss_pct=stop_loss_pct, take_profit_pct=take_profit_pct)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def cached_indicator_chart(fingerprint, columns, _df):
+    with timed("app.plots"):
+        return plot_all_indicators(_df[list(columns)])
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def cached_monte_carlo(fingerprint, long_expr, short_expr, exit_expr, stop_loss_pct, take_profit_pct, mc_method, mc_paths, _df):
+    result = cached_backtest(fingerprint, long_expr, short_expr, exit_expr, stop_loss_pct, take_profit_pct, _df)
+    with timed("app.monte_carlo"):
+        # Fixed seed, so a rerun shows the same distribution.
+        return monte_carlo(result, mc_method, paths=mc_paths, seed=0)
 
-    if expressions:
-        return " & ".join(expressions)
-    else:
-        return "pd.Series([False] * len(df), index=df.index)"
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def cached_result_charts(fingerprint, long_expr, short_expr, exit_expr, stop_loss_pct, take_profit_pct, mc_method, mc_paths, _df):
+    result = cached_backtest(fingerprint, long_expr, short_expr, exit_expr, stop_loss_pct, take_profit_pct, _df)
+    bands = None
+    if mc_method is not None:
+        bands = cached_monte_carlo(fingerprint, long_expr, short_expr, exit_expr, stop_loss_pct, take_profit_pct, mc_method, mc_paths, _df)['bands']
+    with timed("app.plots"):
+        return plot_equity_curve(result['equity'], bands=bands), plot_pnl_histogram(result['trade_pnls'])
 
 
 st.set_page_config(layout="wide")
@@ -158,6 +203,12 @@ st.sidebar.caption("Select the stock ticker, timeframe, and historical period to
 ticker = st.sidebar.text_input("Ticker", value="AAPL")
 interval = st.sidebar.selectbox("Interval", ["1m", "5m", "15m", "1h", "1d"], index=4)
 period = st.sidebar.selectbox("Period", ["7d", "30d", "60d", "90d", "1y", "2y", "5y", "10y"], index=6)
+interval_choices = ["1m", "5m", "15m", "1h", "1d", "1wk"]
+higher_timeframes = st.sidebar.multiselect(
+    "Higher Timeframes",
+    interval_choices[interval_choices.index(interval) + 1:],
+    help="Also compute the selected indicators on coarser bars resampled from this fetch. Their columns are named like SMA_20@1h and only change once the higher-timeframe bar has closed."
+)
 
 st.sidebar.markdown("---")
 
@@ -198,19 +249,34 @@ for i, config in enumerate(st.session_state.selected_indicators):
     remaining.append(config)
 st.session_state.selected_indicators = remaining
 
+cache_stats = indicator_cache.stats()
+st.sidebar.caption(f"Indicator cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries ({cache_stats['nbytes'] / 1e6:.1f} MB)")
+profile_enabled = st.sidebar.checkbox("Profile this run (cProfile)", help="Records a cProfile dump of the next run, shown in the Performance panel.")
+run_timer = StageTimer(profile=profile_enabled).start()
+
 st.markdown("Once your market settings and indicators are ready, click the button below to fetch data and run your strategy.")
 if st.button("Fetch Data & Run Backtest"):
-    df = fetch_data(ticker, period, interval)
+    with timed("app.fetch"):
+        df = fetch_data(ticker, period, interval)
+    fingerprint = data_fingerprint(df)
+
+    with timed("app.indicators"):
+        for outputs in get_indicators_many(df, st.session_state.selected_indicators, fingerprint=fingerprint):
+            for col, series in outputs.items():
+                df[col] = series
 
-    for config in st.session_state.selected_indicators:
-        outputs = get_indicators(df, config)
-        for col, series in outputs.items():
-            df[col] = series
+        if higher_timeframes and df is not None and not df.empty:
+            pyramid = TimeframePyramid(df[["Open", "High", "Low", "Close", "Volume"]], interval)
+            for timeframe in higher_timeframes:
+                for col, series in pyramid.indicator_columns(timeframe, st.session_state.selected_indicators).items():
+                    df[col] = series
 
     st.session_state.df = df
+    st.session_state.fingerprint = data_fingerprint(df)
 
 if "df" in st.session_state:
     df = st.session_state.df
+    fingerprint = st.session_state.fingerprint
 
     st.subheader(f"Fetched Data for **{ticker}** | Interval: `{interval}`, Period: `{period}`")
     st.caption("Here's the historical market data along with your selected indicators.")
@@ -243,17 +309,15 @@ if "df" in st.session_state:
     **Take Profit**: Automatically exits a trade once it gains more than Y percent from the entry.
     """)
 
-    try:
-        safe_globals = {
-            "df": df,
-            "pd": pd,
-            "len": len,
-            "__builtins__": {}
-        }
+    st.markdown("### Monte Carlo Robustness")
+    st.caption("Resample the backtest into many alternative paths and shade the equity curve with their 5-95% and 25-75% bands.")
+    mc_label = st.selectbox("Resampling", list(MONTE_CARLO_METHODS), index=0)
+    mc_method = MONTE_CARLO_METHODS[mc_label]
+    mc_paths = int(st.number_input("Paths", min_value=100, max_value=100_000, value=10_000, step=1000, disabled=mc_method is None))
 
-        long_signal = eval(long_entry_expr, safe_globals)
-        short_signal = eval(short_entry_expr, safe_globals)
-        exit_signal = eval(exit_expr, safe_globals)
+    try:
+        strategy_key = (fingerprint, long_entry_expr, short_entry_expr, exit_expr)
+        cached_signals(*strategy_key, df)
 
         st.success("Strategy logic compiled and executed.")
         st.caption("Your strategy signals were generated successfully. Here's how the strategy performed:")
@@ -265,25 +329,32 @@ if "df" in st.session_state:
 
         indicator_cols = [col for col in df.columns if col not in ['Open', 'High', 'Low', 'Volume']]
         if indicator_cols:
-            st.plotly_chart(plot_all_indicators(df[indicator_cols]), key="all_indicators")
+            st.plotly_chart(cached_indicator_chart(fingerprint, tuple(indicator_cols), df), key="all_indicators")
         else:
             st.info("No indicators to display.")
 
 
-        result = backtest(
-            df,
-            long_signal,
-            short_signal,
-            exit_signal,
-            stop_loss_pct=stop_loss_pct,
-            take_profit_pct=take_profit_pct
-        )
+        result = cached_backtest(*strategy_key, stop_loss_pct, take_profit_pct, df)
+        mc_result = None
+        if mc_method is not None:
+            try:
+                mc_result = cached_monte_carlo(*strategy_key, stop_loss_pct, take_profit_pct, mc_method, mc_paths, df)
+            except ValueError as e:
+                st.warning(f"Monte Carlo skipped: {e}")
+                mc_method = None
+        equity_chart, pnl_histogram = cached_result_charts(*strategy_key, stop_loss_pct, take_profit_pct, mc_method, mc_paths, df)
     
 
 
         st.subheader("Equity Curve")
         st.caption("This shows how your portfolio would have grown over time.")
-        st.plotly_chart(plot_equity_curve(result['equity']), key="equity_curve")
+        st.plotly_chart(equity_chart, key="equity_curve")
+
+        if mc_result is not None:
+            st.subheader("Monte Carlo Distribution")
+            st.caption(f"{mc_paths:,} resampled paths ({mc_label.lower()}). Quantiles of each path's metrics, next to the same metrics for the actual trade sequence.")
+            st.dataframe(pd.concat([mc_result['summary'], pd.DataFrame(mc_result['observed'], index=["observed"])]))
+            st.metric("Probability of Loss", f"{mc_result['probability_of_loss']*100:.1f}%")
 
         st.subheader("Backtest Results")
         st.dataframe(result["equity"])
@@ -337,7 +408,7 @@ if "df" in st.session_state:
         if not result['trades'].empty:
             st.subheader("Trade Log")
             st.caption("Details of each trade executed by the strategy.")
-            st.dataframe(result['trades'].style.format({
+            st.dataframe(result['trades'].to_frame().style.format({
                 "Entry Price": "{:.2f}",
                 "Exit Price": "{:.2f}",
                 "PnL": "{:.2f}"
@@ -345,15 +416,88 @@ if "df" in st.session_state:
 
         st.subheader("PnL Histogram")
         st.caption("Distribution of profits and losses from all trades.")
-        st.plotly_chart(plot_pnl_histogram(result['trades']), key="pnl_histogram")
+        st.plotly_chart(pnl_histogram, key="pnl_histogram")
         
 
         st.sidebar.markdown('---')
 
-        n_trials = st.sidebar.number_input("Number of Trials", min_value=1, max_value=1000, value=50)
+        opt_method = st.sidebar.radio("Optimisation Method", ["Bayesian", "Grid Search", "Walk-Forward"])
+        if opt_method == "Bayesian":
+            n_trials = st.sidebar.number_input("Number of Trials", min_value=1, max_value=1000, value=50)
+            n_jobs = st.sidebar.number_input("Parallel Workers", min_value=1, max_value=os.cpu_count() or 1, value=1)
+            prune_trials = st.sidebar.checkbox("Prune losing trials early", help="Stops trials whose running return falls below the median of earlier trials at the same checkpoint (every 10% of bars).")
+        elif opt_method == "Grid Search":
+            grid_stride = st.sidebar.number_input("Grid Stride", min_value=1, max_value=20, value=1)
+            float_steps = st.sidebar.number_input("Steps for Decimal Parameters", min_value=2, max_value=20, value=5)
+        else:
+            train_size = st.sidebar.number_input("Train Window (bars)", min_value=10, max_value=max(len(df) - 1, 10), value=max(len(df) // 2, 10))
+            test_size = st.sidebar.number_input("Test Window (bars)", min_value=1, max_value=max(len(df) - 1, 1), value=max(len(df) // 6, 1))
+            anchored = st.sidebar.checkbox("Anchored (train from the first bar)")
+            n_trials = st.sidebar.number_input("Trials per Fold", min_value=1, max_value=1000, value=30)
+            n_jobs = st.sidebar.number_input("Parallel Folds", min_value=1, max_value=os.cpu_count() or 1, value=1)
         optimise = st.sidebar.button("Optimise Indicators")
-        st.sidebar.caption("Tune indicator parameters using Bayesian Optimization to maximize strategy returns.")
-        if optimise:
+        st.sidebar.caption("Tune indicator parameters using Bayesian Optimization or an exhaustive grid search to maximize strategy returns.")
+        if optimise and opt_method == "Grid Search":
+            st.info("Running grid search over every parameter combination...")
+            strides = {
+                f"{cfg['name']}_{key}": grid_stride
+                for cfg in st.session_state.selected_indicators
+                for key in cfg.get("param_grid", {})
+            }
+            with timed("app.optimise"):
+                st.session_state.grid_results = grid_optimiser(
+                    df,
+                    st.session_state.selected_indicators,
+                    long_entry_expr,
+                    short_entry_expr,
+                    exit_expr,
+                    strides=strides,
+                    float_steps=float_steps,
+                    stop_loss_pct=stop_loss_pct,
+                    take_profit_pct=take_profit_pct
+                )
+
+        if opt_method == "Grid Search" and "grid_results" in st.session_state:
+            grid_results = st.session_state.grid_results
+            if grid_results.empty:
+                st.error("No valid parameter combinations found.")
+            else:
+                param_cols = [col for col in grid_results.columns if col not in GRID_METRICS]
+                st.success(f"Evaluated {len(grid_results)} parameter combinations.")
+                st.dataframe(grid_results)
+                if len(param_cols) >= 2:
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        x_param = st.selectbox("X Axis", param_cols, index=0)
+                    with col2:
+                        y_param = st.selectbox("Y Axis", param_cols, index=1)
+                    with col3:
+                        heatmap_metric = st.selectbox("Metric", GRID_METRICS, index=0)
+                    st.plotly_chart(plot_param_heatmap(grid_results, x_param, y_param, heatmap_metric), key="grid_heatmap")
+        if optimise and opt_method == "Walk-Forward":
+            st.info("Running walk-forward optimisation...")
+            with timed("app.optimise"):
+                st.session_state.walk_forward = walk_forward_optimiser(
+                    df,
+                    st.session_state.selected_indicators,
+                    long_entry_expr,
+                    short_entry_expr,
+                    exit_expr,
+                    train_size=train_size,
+                    test_size=test_size,
+                    anchored=anchored,
+                    n_trials=n_trials,
+                    n_jobs=n_jobs
+                )
+
+        if opt_method == "Walk-Forward" and "walk_forward" in st.session_state:
+            walk_forward = st.session_state.walk_forward
+            st.subheader("Walk-Forward Results")
+            st.caption("Out-of-sample equity stitched across test windows, with the parameters chosen on each train window.")
+            st.plotly_chart(plot_equity_curve(walk_forward["equity"]), key="walk_forward_equity")
+            st.metric("Out-of-Sample Return", f"${walk_forward['total_return']:.2f}")
+            st.dataframe(walk_forward["folds"])
+        elif optimise and opt_method == "Bayesian":
             st.info("Running parameter optimization...")
             with st.expander("How does Bayesian Optimization work?"):
                 st.markdown("""
@@ -370,19 +514,19 @@ if "df" in st.session_state:
 
                 You can control how many combinations are tested with the **Number of Trials** slider in the sidebar.
                 """)
-            result, best_config = bayesian_optimiser(df, st.session_state.selected_indicators, long_entry_expr, short_entry_expr, exit_expr, n_trials)
+            with timed("app.optimise"):
+                result, best_config = bayesian_optimiser(df, st.session_state.selected_indicators, long_entry_expr, short_entry_expr, exit_expr, n_trials, n_jobs=n_jobs, pruner="median" if prune_trials else None)
 
-        if result:
-            st.success("Best parameters and results after optimization:")
-            st.success("Best results from parameter optimization:")
-            for cfg in best_config:
-                st.write(f"• {cfg['name'].upper()} → {cfg['params']}")
+            if result and best_config:
+                st.success("Best parameters and results after optimization:")
+                for cfg in best_config:
+                    st.write(f"• {cfg['name'].upper()} → {cfg['params']}")
 
                 st.plotly_chart(plot_equity_curve(result['equity']), key=f"equity_curve_opt_{uuid.uuid4()}")
                 st.metric("Total Return", f"${result['total_return']:.2f}")
                 st.metric("CAGR", f"{result['CAGR']*100:.2f}%")
                 st.metric("Sharpe Ratio", f"{result['sharpe_ratio']:.2f}")
-            else:
+            if not best_config:
                 st.error("No valid parameter combinations found.")
     except Exception as e:
         st.error(f"Error in strategy logic: {e}")
@@ -390,4 +534,20 @@ if "df" in st.session_state:
 else:
     st.info("Please fetch data and run backtest first.")
 
-
+run_timer.stop()
+with st.expander("Performance"):
+    st.caption("Time spent in each stage of this run; `total` is the whole rerun. Stages nest (e.g. `app.backtest` includes `backtest.simulate`), so the totals overlap, and cached stages that were reused do not appear.")
+    timings = run_timer.to_frame()
+    if timings.empty:
+        st.info("Nothing was timed in this run.")
+    else:
+        st.dataframe(timings.sort_values("seconds", ascending=False, ignore_index=True))
+    if run_timer.counters:
+        st.dataframe(pd.Series(run_timer.counters, name="count"))
+    if run_timer.profiler is not None:
+        st.code(run_timer.profile_stats())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_path = os.path.join(tmp_dir, "backtester.prof")
+            run_timer.dump_profile(profile_path)
+            with open(profile_path, "rb") as f:
+                st.download_button("Download cProfile dump", f.read(), file_name="backtester.prof")
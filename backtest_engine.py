@@ -1,35 +1,144 @@
 import pandas as pd
 import numpy as np
+from bisect import bisect_left
+from profiling import timed
 
-def backtest(data, long_signal, short_signal, exit_signal, initial_capital=10000, position_size=0.95, stop_loss_pct=0.0, take_profit_pct=0.0):
-    ini_cap = initial_capital
+def backtest(data, long_signal, short_signal, exit_signal, initial_capital=10000, position_size=0.95, stop_loss_pct=0.0, take_profit_pct=0.0, engine="array", checkpoints=None, on_checkpoint=None, lean=False):
+    # on_checkpoint(step, bar, total_return) is called after each of the
+    # `checkpoints` evenly spaced slices of the history; raising from it stops
+    # the run (used for pruning optimiser trials).
+    # lean=True returns only the raw equity array, total_return and the trades,
+    # skipping the other metrics and the equity/drawdown Series (used by
+    # optimiser trials, which only read the objective).
+    timings = {}
+    if engine == "array":
+        with timed("backtest.simulate", timings):
+            equity, trades = _run_array(
+                data, long_signal, short_signal, exit_signal,
+                initial_capital, position_size, stop_loss_pct, take_profit_pct,
+                checkpoints, on_checkpoint
+            )
+    elif engine == "loop":
+        if on_checkpoint is not None:
+            raise ValueError("Checkpoint callbacks are only supported by the 'array' engine")
+        with timed("backtest.simulate", timings):
+            equity, trades = _run_loop(
+                data, long_signal, short_signal, exit_signal,
+                initial_capital, position_size, stop_loss_pct, take_profit_pct
+            )
+    elif engine == "sparse":
+        if on_checkpoint is not None:
+            raise ValueError("Checkpoint callbacks are only supported by the 'array' engine")
+        with timed("backtest.simulate", timings):
+            equity, trades = _run_sparse(
+                data, long_signal, short_signal, exit_signal,
+                initial_capital, position_size, stop_loss_pct, take_profit_pct
+            )
+    else:
+        raise ValueError(f"Unknown backtest engine '{engine}', expected 'array', 'sparse' or 'loop'")
+
+    with timed("backtest.metrics", timings):
+        result = _build_result(data, equity, trades, initial_capital, lean=lean)
+    result["timings"] = timings
+    return result
+
+
+class TradeLog:
+    # Closed trades stored column-wise in typed arrays that double in size when
+    # full. The DataFrame view is only built (and then kept) when asked for.
+    COLUMNS = ("entry_bar", "exit_bar", "side", "entry_price", "exit_price", "shares", "pnl")
+
+    def __init__(self, index, capacity=64):
+        self.index = index
+        self.size = 0
+        self.entry_bar = np.empty(capacity, dtype=np.int64)
+        self.exit_bar = np.empty(capacity, dtype=np.int64)
+        self.side = np.empty(capacity, dtype=np.int8)
+        self.entry_price = np.empty(capacity, dtype=np.float64)
+        self.exit_price = np.empty(capacity, dtype=np.float64)
+        self.shares = np.empty(capacity, dtype=np.float64)
+        self.pnl = np.empty(capacity, dtype=np.float64)
+        self._frame = None
+
+    def append(self, entry_bar, exit_bar, side, entry_price, exit_price, shares, pnl):
+        i = self.size
+        if i == len(self.pnl):
+            self._grow()
+        self.entry_bar[i] = entry_bar
+        self.exit_bar[i] = exit_bar
+        self.side[i] = side
+        self.entry_price[i] = entry_price
+        self.exit_price[i] = exit_price
+        self.shares[i] = shares
+        self.pnl[i] = pnl
+        self.size = i + 1
+        self._frame = None
+
+    def _grow(self):
+        capacity = max(2 * len(self.pnl), 1)
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def column(self, name):
+        if name not in self.COLUMNS:
+            raise KeyError(name)
+        return getattr(self, name)[:self.size]
+
+    @property
+    def pnls(self):
+        return self.pnl[:self.size]
+
+    @property
+    def empty(self):
+        return self.size == 0
+
+    def __len__(self):
+        return self.size
+
+    def to_frame(self):
+        if self._frame is None:
+            side = self.column("side")
+            self._frame = pd.DataFrame({
+                "Entry Time": self.index[self.column("entry_bar")],
+                "Exit Time": self.index[self.column("exit_bar")],
+                "Type": np.where(side == 1, "Long", "Short"),
+                "Entry Price": self.column("entry_price"),
+                "Exit Price": self.column("exit_price"),
+                "Shares": self.column("shares"),
+                "PnL": self.column("pnl")
+            })
+        return self._frame
+
+
+def _run_loop(data, long_signal, short_signal, exit_signal, initial_capital, position_size, stop_loss_pct, take_profit_pct):
     capital = initial_capital
     position = 0
     shares = 0
     entry_price = 0
     equity = []
-    trade_pnls = []
-    trades = []
+    trades = TradeLog(data.index)
 
     for i in range(len(data)):
         current_price = data['Close'].iloc[i]
-        date = data.index[i]
 
         if position == 0:
             if long_signal.iloc[i]:
                 shares = int((capital * position_size) / current_price)
-                if shares > 0:  
+                if shares > 0:
                     capital -= shares * current_price
                     entry_price = current_price
-                    entry_index = date
+                    entry_bar = i
                     position = 1
 
             elif short_signal.iloc[i]:
                 shares = int((capital * position_size) / current_price)
-                if shares > 0: 
+                if shares > 0:
                     capital += shares * current_price
                     entry_price = current_price
-                    entry_index = date
+                    entry_bar = i
                     position = -1
 
         elif position != 0:
@@ -45,15 +154,7 @@ def backtest(data, long_signal, short_signal, exit_signal, initial_capital=10000
                     capital -= shares * current_price
                     pnl = (entry_price - current_price) * shares
 
-                trade_pnls.append(pnl)
-                trades.append({
-                    "Entry Time": entry_index,
-                    "Exit Time": date,
-                    "Type": "Long" if position == 1 else "Short",
-                    "Entry Price": entry_price,
-                    "Exit Price": current_price,
-                    "PnL": pnl
-                })
+                trades.append(entry_bar, i, position, entry_price, current_price, shares, pnl)
 
                 position = 0
                 shares = 0
@@ -68,43 +169,458 @@ def backtest(data, long_signal, short_signal, exit_signal, initial_capital=10000
 
         equity.append(portfolio_value)
 
-    equity_series = pd.Series(equity, index=data.index)
-    returns = equity_series.pct_change().dropna()
-    
-    sharpe = returns.mean() / returns.std() * np.sqrt(252) if not returns.empty and returns.std() != 0 else 0
-    
-    if len(equity) > 1:
-        start_date = data.index[0]
-        end_date = data.index[-1]
-        years = (end_date - start_date).days / 365.25
-        cagr = ((equity[-1] / ini_cap) ** (1 / years)) - 1 if years > 0 else 0
-    else:
-        cagr = 0
-    
-    max_dd, drawdown_series = calculate_max_drawdown(equity_series)
-    sortino_ratio = calculate_sortino_ratio(returns)    
-    calmar_ratio = cagr / abs(max_dd) if max_dd != 0 else 0
+    return np.asarray(equity, dtype=np.float64), trades
+
+
+def _run_array(data, long_signal, short_signal, exit_signal, initial_capital, position_size, stop_loss_pct, take_profit_pct, checkpoints=None, on_checkpoint=None, state=None):
+    # state (a BacktestState.checkpoint() dict) continues a run from an earlier
+    # block of bars: bar numbers in the trade log then count from state["bar"],
+    # and the dict is updated in place with the state after the last bar.
+    close_arr = np.ascontiguousarray(data['Close'].to_numpy(dtype=np.float64))
+    n = len(close_arr)
+
+    long_arr = _signal_array(long_signal, n)
+    short_arr = _signal_array(short_signal, n)
+    exit_arr = _signal_array(exit_signal, n)
+
+    capital = initial_capital
+    position = 0
+    shares = 0
+    entry_price = 0
+    entry_bar = 0
+    offset = 0
+    if state is not None:
+        capital, position, shares, entry_price, entry_bar, offset = (state[key] for key in ("capital", "position", "shares", "entry_price", "entry_bar", "bar"))
+    start_cash = capital
+    start_held = position * shares
+    change_bars = []
+    change_cash = []
+    change_held = []
+    trades = TradeLog(data.index)
+
+    segment_start = 0
+    for step, segment_end in enumerate(_checkpoint_bars(n, checkpoints if on_checkpoint is not None else None)):
+        # Scalar access into Python lists is much cheaper than into ndarrays,
+        # so the state machine walks list copies and only records the bars
+        # where it changes. They are made a segment at a time, so a run
+        # stopped at a checkpoint does not pay for the bars after it.
+        rows = zip(
+            range(segment_start, segment_end),
+            close_arr[segment_start:segment_end].tolist(),
+            long_arr[segment_start:segment_end].tolist(),
+            short_arr[segment_start:segment_end].tolist(),
+            exit_arr[segment_start:segment_end].tolist()
+        )
+        for i, current_price, is_long, is_short, is_exit in rows:
+            if position == 0:
+                if is_long:
+                    shares = int((capital * position_size) / current_price)
+                    if shares > 0:
+                        capital -= shares * current_price
+                        entry_price = current_price
+                        entry_bar = offset + i
+                        position = 1
+                        change_bars.append(i)
+                        change_cash.append(capital)
+                        change_held.append(shares)
+
+                elif is_short:
+                    shares = int((capital * position_size) / current_price)
+                    if shares > 0:
+                        capital += shares * current_price
+                        entry_price = current_price
+                        entry_bar = offset + i
+                        position = -1
+                        change_bars.append(i)
+                        change_cash.append(capital)
+                        change_held.append(-shares)
+
+            else:
+                price_change = (current_price - entry_price) / entry_price if position == 1 else (entry_price - current_price) / entry_price
+                hit_stop_loss = stop_loss_pct > 0 and price_change <= -stop_loss_pct / 100
+                hit_take_profit = take_profit_pct > 0 and price_change >= take_profit_pct / 100
+
+                if is_exit or hit_stop_loss or hit_take_profit:
+                    if position == 1:
+                        capital += shares * current_price
+                        pnl = (current_price - entry_price) * shares
+                    else:
+                        capital -= shares * current_price
+                        pnl = (entry_price - current_price) * shares
+
+                    trades.append(entry_bar, offset + i, position, entry_price, current_price, shares, pnl)
+
+                    position = 0
+                    shares = 0
+                    entry_price = 0
+                    change_bars.append(i)
+                    change_cash.append(capital)
+                    change_held.append(0)
+
+        segment_start = segment_end
+        if on_checkpoint is not None and segment_end > 0:
+            last_price = float(close_arr[segment_end - 1])
+            if position == 1:
+                value = capital + shares * last_price
+            elif position == -1:
+                value = capital - shares * last_price
+            else:
+                value = capital
+            on_checkpoint(step, segment_end - 1, value - initial_capital)
+
+    cash, held = _fill_state(n, start_cash, change_bars, change_cash, change_held, start_held)
+    equity = np.where(held != 0, cash + held * close_arr, cash)
+    if state is not None:
+        state.update(capital=capital, position=position, shares=shares, entry_price=entry_price, entry_bar=entry_bar, bar=offset + n)
+    return equity, trades
+
+
+def _run_sparse(data, long_signal, short_signal, exit_signal, initial_capital, position_size, stop_loss_pct, take_profit_pct):
+    # Same rules as _run_array, but only visits the bars where something can
+    # happen: while flat it jumps to the next bar with an entry signal, and
+    # while in a position to the next exit signal, checking stop-loss and
+    # take-profit over the bars in between in one vectorised pass. Cost grows
+    # with trades and bars spent in a position instead of with history length.
+    close_arr = np.ascontiguousarray(data['Close'].to_numpy(dtype=np.float64))
+    n = len(close_arr)
+    longs = _signal_array(long_signal, n)
+    shorts = _signal_array(short_signal, n)
+    # Plain lists: bisect on them is much cheaper per trade than
+    # np.searchsorted, which matters when the signals are dense.
+    entry_bars = np.flatnonzero(longs | shorts).tolist()
+    exit_bars = np.flatnonzero(_signal_array(exit_signal, n)).tolist()
+    use_stop_loss = stop_loss_pct > 0
+    use_take_profit = take_profit_pct > 0
+    stop_loss_level = -stop_loss_pct / 100
+    take_profit_level = take_profit_pct / 100
+
+    capital = initial_capital
+    change_bars = []
+    change_cash = []
+    change_held = []
+    trades = TradeLog(data.index)
+
+    cursor = 0
+    k = 0
+    while True:
+        k = bisect_left(entry_bars, cursor, k)
+        if k >= len(entry_bars):
+            break
+        i = entry_bars[k]
+        k += 1
+        entry_price = float(close_arr[i])
+        position = 1 if longs[i] else -1
+        shares = int((capital * position_size) / entry_price)
+        if shares <= 0:
+            # A long signal with nothing affordable does not fall through to
+            # the short side, as in the bar-by-bar engines.
+            cursor = i + 1
+            continue
+        capital = capital - shares * entry_price if position == 1 else capital + shares * entry_price
+        change_bars.append(i)
+        change_cash.append(capital)
+        change_held.append(position * shares)
+
+        e = bisect_left(exit_bars, i + 1)
+        j = exit_bars[e] if e < len(exit_bars) else n
+        if use_stop_loss or use_take_profit:
+            # Blocks double in size so a stop hit soon after entry does not
+            # pay for scanning all the way to a distant exit signal.
+            start = i + 1
+            block = 64
+            end = min(j + 1, n)
+            while start < end:
+                window = close_arr[start:min(start + block, end)]
+                price_change = (window - entry_price) / entry_price if position == 1 else (entry_price - window) / entry_price
+                hit = np.zeros(len(window), dtype=bool)
+                if use_stop_loss:
+                    hit |= price_change <= stop_loss_level
+                if use_take_profit:
+                    hit |= price_change >= take_profit_level
+                hits = np.flatnonzero(hit)
+                if len(hits):
+                    j = start + int(hits[0])
+                    break
+                start += len(window)
+                block *= 2
+        if j >= n:
+            break
+
+        current_price = float(close_arr[j])
+        if position == 1:
+            capital += shares * current_price
+            pnl = (current_price - entry_price) * shares
+        else:
+            capital -= shares * current_price
+            pnl = (entry_price - current_price) * shares
+        trades.append(i, j, position, entry_price, current_price, shares, pnl)
+        change_bars.append(j)
+        change_cash.append(capital)
+        change_held.append(0)
+        # No entries on the bar a position closes.
+        cursor = j + 1
 
-    wins = sum(pnl > 0 for pnl in trade_pnls)
-    total_trades = len(trade_pnls)
-    win_percentage = (wins / total_trades * 100) if total_trades > 0 else 0
+    cash, held = _fill_state(n, initial_capital, change_bars, change_cash, change_held)
+    equity = np.where(held != 0, cash + held * close_arr, cash)
+    return equity, trades
 
-    trades_df = pd.DataFrame(trades)
+
+def _checkpoint_bars(n, checkpoints):
+    if not checkpoints:
+        return [n]
+    count = max(1, min(int(checkpoints), n))
+    return sorted(set(-(-n * k // count) for k in range(1, count + 1)))
+
+
+def _signal_array(signal, n):
+    values = np.asarray(signal, dtype=bool)
+    if values.shape != (n,):
+        raise ValueError(f"Signal has shape {values.shape}, expected ({n},)")
+    return values
+
+
+def _fill_state(n, initial_capital, change_bars, change_cash, change_held, initial_held=0):
+    # Cash and signed share count are constant between state changes, so each bar
+    # just points at the most recent change (slot 0 holds the starting state).
+    slots = np.zeros(n, dtype=np.intp)
+    slots[np.asarray(change_bars, dtype=np.intp)] = np.arange(1, len(change_bars) + 1)
+    slots = np.maximum.accumulate(slots) if n else slots
+
+    cash = np.asarray([initial_capital] + change_cash, dtype=np.float64)[slots]
+    held = np.asarray([initial_held] + change_held, dtype=np.float64)[slots]
+    return cash, held
+
+
+def _build_result(data, equity, trades, ini_cap, lean=False):
+    pnls = trades.pnls
+    if lean:
+        return {
+            'total_return': (equity[-1] if len(equity) else ini_cap) - ini_cap,
+            'num_trades': len(pnls),
+            'trade_pnls': pnls,
+            'trades': trades,
+            'equity': equity
+        }
+
+    metrics, drawdown = fused_metrics(equity[:, None], data.index, ini_cap, np.array([len(pnls)]), np.array([np.count_nonzero(pnls > 0)]))
+    result = {key: values[0] for key, values in metrics.items()}
+    result['trade_pnls'] = pnls
+    result['trades'] = trades
+    result['equity'] = pd.Series(equity, index=data.index)
+    result['drawdown'] = pd.Series(drawdown[:, 0], index=data.index)
+    return result
+
+
+def backtest_batch(data, long_signals, short_signals, exit_signals, initial_capital=10000, position_size=0.95, stop_loss_pct=0.0, take_profit_pct=0.0, labels=None):
+    n = len(data)
+
+    if labels is None:
+        labels = long_signals.columns if isinstance(long_signals, pd.DataFrame) else None
+    longs = _signal_matrix(long_signals, n)
+    shorts = _signal_matrix(short_signals, n)
+    exits = _signal_matrix(exit_signals, n)
+    k = longs.shape[1]
+    if shorts.shape[1] != k or exits.shape[1] != k:
+        raise ValueError("Long, short and exit signal matrices must have the same number of columns")
+    if labels is None:
+        labels = pd.RangeIndex(k)
+
+    stop_loss = np.broadcast_to(np.asarray(stop_loss_pct, dtype=np.float64), (k,))
+    take_profit = np.broadcast_to(np.asarray(take_profit_pct, dtype=np.float64), (k,))
+    close_arr = np.ascontiguousarray(data['Close'].to_numpy(dtype=np.float64))
+    equity, num_trades, num_wins = _run_columns(close_arr, longs, shorts, exits, initial_capital, position_size, stop_loss, take_profit)
+
+    equity_df = pd.DataFrame(equity, index=data.index, columns=labels)
+    metrics = pd.DataFrame(fused_metrics(equity, data.index, initial_capital, num_trades, num_wins)[0], index=labels)
+    metrics.insert(0, 'stop_loss_pct', stop_loss)
+    metrics.insert(1, 'take_profit_pct', take_profit)
 
     return {
-        'equity': equity_series,
+        'equity': equity_df,
+        'metrics': metrics
+    }
+
+
+def _run_columns(close_arr, longs, shorts, exits, initial_capital, position_size, stop_loss, take_profit):
+    # The rules of _run_sparse, stepped for all K columns at once: cursor,
+    # capital, position, shares and entry price are length-K arrays, and each
+    # round moves every column through one trade (jump to its next entry, then
+    # to its exit signal or stop). The Python loop runs once per trade of the
+    # busiest column instead of once per bar or per column.
+    n, k = longs.shape
+    entry_events = _events(longs | shorts)
+    exit_events = _events(exits)
+    use_stops = (stop_loss > 0) | (take_profit > 0)
+    stop_loss_level = np.where(stop_loss > 0, -stop_loss / 100, -np.inf)
+    take_profit_level = np.where(take_profit > 0, take_profit / 100, np.inf)
+
+    cursor = np.zeros(k, dtype=np.intp)
+    capital = np.full(k, float(initial_capital))
+    change_bars, change_cols, change_cash, change_held = [], [], [], []
+    exit_cols, exit_wins = [], []
+
+    active = np.arange(k)
+    while len(active):
+        i = _next_event(entry_events, n, active, cursor[active])
+        live = i < n
+        active, i = active[live], i[live]
+        if not len(active):
+            break
+
+        entry_price = close_arr[i]
+        position = np.where(longs[i, active], 1, -1)
+        shares = (capital[active] * position_size / entry_price).astype(np.int64)
+        # Columns with nothing affordable look for their next entry from the
+        # following bar, without falling through to the short side.
+        waiting = shares <= 0
+        cursor[active[waiting]] = i[waiting] + 1
+        entered = ~waiting
+        cols, i, entry_price, position, shares = active[entered], i[entered], entry_price[entered], position[entered], shares[entered]
+        held = position * shares
+        capital[cols] -= held * entry_price
+        change_bars.append(i)
+        change_cols.append(cols)
+        change_cash.append(capital[cols])
+        change_held.append(held)
+
+        j = _next_event(exit_events, n, cols, i + 1)
+        stops = np.flatnonzero(use_stops[cols])
+        if len(stops):
+            j[stops] = _first_stop(close_arr, i[stops] + 1, np.minimum(j[stops] + 1, n), j[stops], entry_price[stops], position[stops], stop_loss_level[cols[stops]], take_profit_level[cols[stops]])
+
+        # A position still open on the last bar ends that column's run.
+        closed = j < n
+        cols, j, entry_price, position, shares, held = cols[closed], j[closed], entry_price[closed], position[closed], shares[closed], held[closed]
+        current_price = close_arr[j]
+        capital[cols] += held * current_price
+        pnl = np.where(position == 1, (current_price - entry_price) * shares, (entry_price - current_price) * shares)
+        change_bars.append(j)
+        change_cols.append(cols)
+        change_cash.append(capital[cols])
+        change_held.append(np.zeros(len(cols), dtype=np.int64))
+        exit_cols.append(cols)
+        exit_wins.append(cols[pnl > 0])
+        # No entries on the bar a position closes.
+        cursor[cols] = j + 1
+
+        active = np.concatenate((active[waiting], cols))
+
+    # Changes were recorded in order within each column, so the running
+    # maximum of their slot numbers points every bar at its latest change
+    # (slot 0 is the starting state), as in _fill_state. State is built one
+    # row per column and returned transposed, so each column of the (n, K)
+    # equity is contiguous and fused_metrics sums it exactly as it sums a
+    # single backtest's equity.
+    slots = np.zeros((k, n), dtype=np.intp)
+    if change_bars:
+        bars = np.concatenate(change_bars)
+        slots[np.concatenate(change_cols), bars] = np.arange(1, len(bars) + 1)
+    slots = np.maximum.accumulate(slots, axis=1) if n else slots
+    cash = np.concatenate(([initial_capital], *change_cash)).astype(np.float64)[slots]
+    held = np.concatenate(([0], *change_held)).astype(np.float64)[slots]
+    equity = np.where(held != 0, cash + held * close_arr, cash).T
+
+    num_trades = np.bincount(np.concatenate(exit_cols), minlength=k) if exit_cols else np.zeros(k, dtype=np.int64)
+    num_wins = np.bincount(np.concatenate(exit_wins), minlength=k) if exit_wins else np.zeros(k, dtype=np.int64)
+    return equity, num_trades, num_wins
+
+
+def _events(values):
+    # Set cells of an (n, K) signal matrix as sorted flat positions
+    # column * n + bar, so one searchsorted finds every column's next event.
+    return np.flatnonzero(values.T)
+
+
+def _next_event(events, n, cols, bars):
+    # First set bar >= bars[c] in each column cols[c], n when there is none.
+    keys = cols * n + bars
+    pos = np.searchsorted(events, keys)
+    if not len(events):
+        return np.full(len(cols), n, dtype=np.intp)
+    found = events[np.minimum(pos, len(events) - 1)] - cols * n
+    return np.where((pos < len(events)) & (found < n), found, n)
+
+
+def _first_stop(close_arr, start, end, exit_bar, entry_price, position, stop_loss_level, take_profit_level):
+    # First bar in [start, end) where each position's stop-loss or
+    # take-profit fires (exit_bar where neither does), scanning all positions
+    # together in blocks that double in size, as in _run_sparse. A short's
+    # (entry - price) / entry is exactly -(price - entry) / entry, so one
+    # signed change serves both sides; disabled stops have infinite levels.
+    exit_bar = exit_bar.copy()
+    rows = np.arange(len(start))
+    last = len(close_arr) - 1
+    block = 64
+    while len(rows):
+        offsets = start[:, None] + np.arange(block)
+        window = close_arr[np.minimum(offsets, last)]
+        price_change = position[:, None] * ((window - entry_price[:, None]) / entry_price[:, None])
+        hit = (price_change <= stop_loss_level[:, None]) | (price_change >= take_profit_level[:, None])
+        hit &= offsets < end[:, None]
+        found = hit.any(axis=1)
+        exit_bar[rows[found]] = start[found] + hit[found].argmax(axis=1)
+        more = ~found & (start + block < end)
+        rows, start, end, entry_price, position, stop_loss_level, take_profit_level = (
+            values[more] for values in (rows, start, end, entry_price, position, stop_loss_level, take_profit_level)
+        )
+        start = start + block
+        block *= 2
+    return exit_bar
+
+
+def _signal_matrix(signals, n):
+    values = np.asarray(signals, dtype=bool)
+    if values.ndim == 1:
+        values = values[:, None]
+    if values.ndim != 2 or values.shape[0] != n:
+        raise ValueError(f"Signal matrix has shape {values.shape}, expected ({n}, K)")
+    return np.ascontiguousarray(values)
+
+
+def fused_metrics(equity, index, ini_cap, num_trades, num_wins):
+    # Every metric for each column of an (n, K) equity matrix, sharing a single
+    # returns array and running max instead of the separate pandas passes in
+    # calculate_max_drawdown / calculate_sortino_ratio (same ddof=1 and NaN
+    # handling, so the numbers match). Also returns the drawdown matrix.
+    n = equity.shape[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = equity[1:] / equity[:-1] - 1
+        valid = ~np.isnan(returns)
+        count = valid.sum(axis=0)
+        filled = np.where(valid, returns, 0.0)
+        mean = filled.sum(axis=0) / count
+        deviation = np.where(valid, returns - mean, 0.0)
+        std = np.sqrt(np.einsum('ij,ij->j', deviation, deviation) / (count - 1))
+        sharpe = np.where((count > 0) & (std != 0), mean / std * np.sqrt(252), 0.0)
+
+        downside = valid & (returns < 0)
+        downside_count = downside.sum(axis=0)
+        downside_returns = np.where(downside, filled, 0.0)
+        downside_mean = downside_returns.sum(axis=0) / downside_count
+        downside_deviation = np.where(downside, returns - downside_mean, 0.0)
+        downside_std = np.where(downside_count > 0, np.sqrt(np.einsum('ij,ij->j', downside_deviation, downside_deviation) / (downside_count - 1)), np.nan)
+        sortino = np.where(downside_std != 0, mean / downside_std * np.sqrt(252), 0.0)
+
+        cumulative_max = np.maximum.accumulate(equity, axis=0)
+        drawdown = (equity - cumulative_max) / cumulative_max
+        max_dd = np.fmin.reduce(drawdown, axis=0)
+
+        years = (index[-1] - index[0]).days / 365.25 if n > 1 else 0
+        cagr = (equity[-1] / ini_cap) ** (1 / years) - 1 if years > 0 else np.zeros(equity.shape[1])
+        calmar = np.where(max_dd != 0, cagr / np.abs(max_dd), 0.0)
+        win_percentage = np.where(num_trades > 0, num_wins / num_trades * 100, 0.0)
+
+    metrics = {
         'total_return': equity[-1] - ini_cap,
         'CAGR': cagr,
         'sharpe_ratio': sharpe,
-        'num_trades': total_trades,
+        'num_trades': num_trades,
         'win_percentage': win_percentage,
-        'trade_pnls': trade_pnls, 
-        'trades': trades_df,
-        'drawdown': drawdown_series,
         'max_drawdown': max_dd,
-        'sortino': sortino_ratio,
-        'calmar': calmar_ratio
+        'sortino': sortino,
+        'calmar': calmar
     }
+    return metrics, drawdown
 
 
 def calculate_max_drawdown(equity):
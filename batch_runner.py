@@ -0,0 +1,309 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_fetcher import fetch_data, slice_period, period_start, OHLCVCache, CACHE_DIR, EARLIEST, _covers, _is_stale
+from price_store import PriceStore
+from indicator_engine import get_indicators_many, data_fingerprint
+from indicator_config import indicators_list
+from strategy_compiler import compile_expr, conditions_to_expr
+from backtest_engine import backtest
+
+
+METRIC_KEYS = ["total_return", "CAGR", "sharpe_ratio", "num_trades", "win_percentage", "max_drawdown", "sortino", "calmar"]
+
+COMPRESSION = "zstd"
+
+
+def load_spec(path):
+    # Spec files are JSON or YAML:
+    #   tickers: [AAPL, MSFT]          (optional, see --tickers)
+    #   period: 5y
+    #   interval: 1d
+    #   strategies:
+    #     - name: sma_trend
+    #       indicators: [{name: sma, params: {period: 20}}]   (same shape as the app's selected_indicators)
+    #       long: [{left: Close, op: ">", right: SMA_20}]     (condition list, or an expression string)
+    #       short: []
+    #       exit: [{left: Close, op: "<", right: SMA_20}]
+    #       stop_loss_pct: 2
+    #       take_profit_pct: 5
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Reading YAML specs requires PyYAML (pip install pyyaml)")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    strategies = spec.get("strategies") or []
+    if not strategies:
+        raise ValueError(f"Spec '{path}' defines no strategies")
+    names = [strategy.get("name") for strategy in strategies]
+    if any(not name for name in names) or len(set(names)) != len(names):
+        raise ValueError("Every strategy needs a unique 'name'")
+    for strategy in strategies:
+        strategy["indicators"] = [_indicator_config(config) for config in strategy.get("indicators", [])]
+    return spec
+
+
+def _indicator_config(config):
+    defaults = next((ind for ind in indicators_list if ind["name"] == config["name"]), None)
+    if defaults is None and "inputs" not in config:
+        raise ValueError(f"Unknown indicator '{config['name']}'; give its 'inputs' explicitly")
+    return {
+        "name": config["name"],
+        "inputs": config.get("inputs", defaults["inputs"] if defaults else None),
+        "params": config.get("params", dict(defaults["params"]) if defaults else {}),
+    }
+
+
+def run_key(ticker, strategy_name):
+    return re.sub(r"[^A-Za-z0-9._-]", "_", f"{ticker.upper()}__{strategy_name}")
+
+
+def completed_runs(output_dir):
+    metrics_dir = os.path.join(output_dir, "metrics")
+    if not os.path.isdir(metrics_dir):
+        return set()
+    return {name[:-len(".parquet")] for name in os.listdir(metrics_dir) if name.endswith(".parquet")}
+
+
+def load_prices(ticker, period, interval, cache_dir, offline, price_store=None):
+    if price_store is not None:
+        # Workers map the same column files instead of each holding a copy of
+        # the parquet data. The store is filled from the cache on first use and
+        # refilled whenever the cache has been topped up since (or, online,
+        # when the stored bars are due a top-up or do not reach back to the
+        # requested period). Online, the cache is first brought up to date for
+        # the requested period through fetch_data's incremental path, and the
+        # store then takes every cached bar.
+        store = PriceStore(price_store)
+        cache = OHLCVCache(cache_dir)
+        stored = store.metadata(ticker, interval)
+        if _store_behind(stored, cache.metadata(ticker, interval), period, interval, offline):
+            if not offline:
+                fetch_data(ticker, period, interval, cache=cache)
+            data, meta = cache.load(ticker, interval)
+            if data is not None and not data.empty:
+                store.write(ticker, interval, data, covered_from=meta["covered_from"], fetched_at=meta["fetched_at"])
+            elif stored is None:
+                return data
+        return slice_period(store.load(ticker, interval), period)
+
+    cache = OHLCVCache(cache_dir)
+    if offline:
+        cached, _ = cache.load(ticker, interval)
+        return slice_period(cached, period)
+    return fetch_data(ticker, period, interval, cache=cache)
+
+
+def _store_behind(stored, cached, period, interval, offline):
+    if stored is None or stored.get("last_bar") is None:
+        return True
+    fetched_at = pd.Timestamp(stored["fetched_at"]) if stored.get("fetched_at") else None
+    if cached["fetched_at"] is not None and (fetched_at is None or cached["fetched_at"] > fetched_at):
+        return True
+    if offline:
+        return False
+    now = pd.Timestamp.now(tz="UTC")
+    covered_from = pd.Timestamp(stored["covered_from"]) if stored.get("covered_from") else None
+    requested_from = period_start(period, now)
+    if not _covers(covered_from, requested_from if requested_from is not None else EARLIEST):
+        return True
+    return _is_stale(pd.Timestamp(stored["last_bar"]), fetched_at, interval, now)
+
+
+def run_ticker(ticker, strategies, settings, output_dir):
+    # Runs every pending strategy for one ticker, so the prices are loaded and
+    # fingerprinted once and indicators shared between strategies hit the
+    # indicator cache. Each finished run is written before the next starts.
+    df = load_prices(ticker, settings["period"], settings["interval"], settings["cache_dir"], settings["offline"], settings.get("price_store"))
+    if df is None or df.empty:
+        return [{"ticker": ticker, "strategy": strategy["name"], "error": "no data", "bars": 0, "seconds": 0.0} for strategy in strategies]
+
+    fingerprint = data_fingerprint(df)
+    outcomes = []
+    for strategy in strategies:
+        start = time.perf_counter()
+        try:
+            result = run_strategy(df, strategy, fingerprint)
+        except Exception as e:
+            outcomes.append({"ticker": ticker, "strategy": strategy["name"], "error": str(e), "bars": len(df), "seconds": time.perf_counter() - start})
+            continue
+
+        seconds = time.perf_counter() - start
+        row = {
+            "ticker": ticker,
+            "strategy": strategy["name"],
+            "bars": len(df),
+            "start": df.index[0],
+            "end": df.index[-1],
+            **{key: result[key] for key in METRIC_KEYS},
+            "seconds": seconds,
+        }
+        write_run(output_dir, ticker, strategy["name"], row, result["equity"])
+        outcomes.append({"ticker": ticker, "strategy": strategy["name"], "error": None, "bars": len(df), "seconds": seconds})
+    return outcomes
+
+
+def run_strategy(df, strategy, fingerprint=None):
+    frame = df
+    columns = {}
+    for outputs in get_indicators_many(df, strategy["indicators"], fingerprint=fingerprint):
+        columns.update(outputs)
+    if columns:
+        frame = df.assign(**columns)
+
+    signals = []
+    for side in ("long", "short", "exit"):
+        logic = strategy.get(side, [])
+        expr = logic if isinstance(logic, str) else conditions_to_expr(logic, frame.columns)
+        signals.append(compile_expr(expr).validate(frame.columns)(frame))
+
+    return backtest(
+        frame,
+        *signals,
+        initial_capital=strategy.get("initial_capital", 10000),
+        position_size=strategy.get("position_size", 0.95),
+        stop_loss_pct=strategy.get("stop_loss_pct", 0.0),
+        take_profit_pct=strategy.get("take_profit_pct", 0.0)
+    )
+
+
+def write_run(output_dir, ticker, strategy_name, row, equity):
+    key = run_key(ticker, strategy_name)
+    equity_frame = pd.DataFrame({
+        "ticker": ticker,
+        "strategy": strategy_name,
+        "timestamp": equity.index,
+        "equity": equity.to_numpy()
+    })
+    # The metrics file marks the run as complete, so it is written last.
+    _write_parquet(equity_frame, os.path.join(output_dir, "equity", f"{key}.parquet"))
+    _write_parquet(pd.DataFrame([row]), os.path.join(output_dir, "metrics", f"{key}.parquet"))
+
+
+def _write_parquet(frame, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp_path, compression=COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+def collect_metrics(output_dir):
+    metrics_dir = os.path.join(output_dir, "metrics")
+    paths = sorted(os.path.join(metrics_dir, name) for name in os.listdir(metrics_dir) if name.endswith(".parquet")) if os.path.isdir(metrics_dir) else []
+    if not paths:
+        return pd.DataFrame()
+    metrics = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    _write_parquet(metrics, os.path.join(output_dir, "metrics.parquet"))
+    return metrics
+
+
+def run_batch(spec, tickers, output_dir, jobs=1, cache_dir=CACHE_DIR, offline=False, fresh=False, price_store=None, log=print):
+    settings = {
+        "period": spec.get("period", "1y"),
+        "interval": spec.get("interval", "1d"),
+        "cache_dir": cache_dir,
+        "offline": offline,
+        "price_store": price_store,
+    }
+    done = set() if fresh else completed_runs(output_dir)
+    pending = {}
+    for ticker in tickers:
+        remaining = [strategy for strategy in spec["strategies"] if run_key(ticker, strategy["name"]) not in done]
+        if remaining:
+            pending[ticker] = remaining
+
+    total = sum(len(strategies) for strategies in pending.values())
+    skipped = len(tickers) * len(spec["strategies"]) - total
+    log(f"{total} runs pending across {len(pending)} tickers ({skipped} already complete)")
+
+    started = time.perf_counter()
+    finished = 0
+    bars = 0
+    failures = []
+
+    def report(outcomes):
+        nonlocal finished, bars
+        for outcome in outcomes:
+            finished += 1
+            if outcome["error"] is None:
+                bars += outcome["bars"]
+            else:
+                failures.append(outcome)
+        elapsed = time.perf_counter() - started
+        ticker = outcomes[0]["ticker"] if outcomes else "?"
+        log(f"[{finished}/{total}] {ticker}: {len(outcomes)} runs | {finished / elapsed:.1f} runs/s, {bars / elapsed:,.0f} bars/s")
+
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(run_ticker, ticker, strategies, settings, output_dir): ticker for ticker, strategies in pending.items()}
+            for future in as_completed(futures):
+                try:
+                    outcomes = future.result()
+                except Exception as e:
+                    ticker = futures[future]
+                    outcomes = [{"ticker": ticker, "strategy": strategy["name"], "error": str(e), "bars": 0, "seconds": 0.0} for strategy in pending[ticker]]
+                report(outcomes)
+    else:
+        for ticker, strategies in pending.items():
+            report(run_ticker(ticker, strategies, settings, output_dir))
+
+    for failure in failures:
+        log(f"FAILED {failure['ticker']} / {failure['strategy']}: {failure['error']}")
+    return collect_metrics(output_dir), failures
+
+
+def read_tickers(args, spec):
+    if args.tickers:
+        return [ticker.strip() for ticker in args.tickers.split(",") if ticker.strip()]
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(spec.get("tickers", []))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run strategy specs across a ticker universe and write metrics and equity curves to parquet.")
+    parser.add_argument("spec", help="JSON or YAML strategy spec")
+    parser.add_argument("--tickers", help="Comma-separated tickers (overrides the spec)")
+    parser.add_argument("--tickers-file", help="File with one ticker per line (overrides the spec)")
+    parser.add_argument("--output", default="batch_results", help="Results directory")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--period", help="Override the spec's period")
+    parser.add_argument("--interval", help="Override the spec's interval")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Local OHLCV cache directory")
+    parser.add_argument("--offline", action="store_true", help="Only use cached data, never download")
+    parser.add_argument("--price-store", help="Memory-mapped price store directory shared by the workers (filled from the cache on first use)")
+    parser.add_argument("--fresh", action="store_true", help="Re-run pairs that already have results")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    if args.period:
+        spec["period"] = args.period
+    if args.interval:
+        spec["interval"] = args.interval
+    tickers = read_tickers(args, spec)
+    if not tickers:
+        parser.error("No tickers given (use --tickers, --tickers-file or a 'tickers' list in the spec)")
+
+    metrics, failures = run_batch(spec, tickers, args.output, jobs=args.jobs, cache_dir=args.cache_dir, offline=args.offline, fresh=args.fresh, price_store=args.price_store)
+    if not metrics.empty:
+        print(metrics.sort_values("total_return", ascending=False).head(20).to_string(index=False))
+        print(f"Results written to {os.path.join(args.output, 'metrics.parquet')} and {os.path.join(args.output, 'equity')}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,473 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import optuna
+import tulipy as tp
+
+from benchmarks.synthetic import generate_ohlcv, random_signals
+from data_fetcher import fetch_data, DataFrameProvider, OHLCVCache, INTERVAL_DELTAS
+from indicator_engine import compute_indicators, indicator_cache, input_values
+from price_store import PriceStore
+from indicator_config import indicators_list
+from indicator_plan import IndicatorPlan
+from backtest_engine import backtest, backtest_batch, _build_result, calculate_max_drawdown
+from visualisation import plot_equity_curve, plot_all_indicators, plot_pnl_histogram, MAX_POINTS
+from optimiser import bayesian_optimiser, _make_objective
+from portfolio import portfolio_backtest
+from streaming import StreamingStrategy
+from chunked import chunked_backtest, write_bar_file
+from monte_carlo import monte_carlo
+from strategy_compiler import compile_expr
+
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+STRATEGY_CONFIGS = [{"name": "sma", "inputs": ["Close"], "params": {"period": 20}, "param_grid": {"period": (10, 50)}}]
+LONG_EXPR = "(df['Close'] > df['SMA_20'])"
+SHORT_EXPR = "(df['Close'] < df['SMA_20'])"
+EXIT_EXPR = "(df['Close'] < df['Open'])"
+
+
+def best_of(repeat, func):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_fetch(df, args):
+    provider = DataFrameProvider({("SYN", "1m"): df.iloc[:-100]})
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OHLCVCache(tmp_dir)
+        cold, _ = best_of(1, lambda: fetch_data("SYN", "max", "1m", provider=provider, cache=cache))
+        provider.frames[("SYN", "1m")] = df
+        # Back-date the fetch so the next call sees an interval's worth of
+        # possible new bars and tops the cache up.
+        cached, meta = cache.load("SYN", "1m")
+        cache.store("SYN", "1m", cached, meta["covered_from"], fetched_at=meta["fetched_at"] - INTERVAL_DELTAS["1m"])
+        del cached
+        top_up, _ = best_of(1, lambda: fetch_data("SYN", "max", "1m", provider=provider, cache=cache))
+        warm, _ = best_of(args.repeat, lambda: fetch_data("SYN", "max", "1m", provider=provider, cache=cache))
+    return {"fetch_cold": cold, "fetch_top_up": top_up, "fetch_warm": warm}
+
+
+def bench_indicators(df, args):
+    results = {}
+    total = 0.0
+    working = []
+    for config in indicators_list:
+        try:
+            elapsed, _ = best_of(args.repeat, lambda: compute_indicators(df, config))
+        except Exception:
+            results[f"indicator_{config['name']}"] = None
+            continue
+        results[f"indicator_{config['name']}"] = elapsed
+        total += elapsed
+        working.append(config)
+    results["indicators_total"] = total
+
+    # The same set in one pass, each indicator on its own vs through the
+    # planner's shared primitives.
+    results["indicators_unplanned"] = best_of(args.repeat, lambda: [compute_indicators(df, config) for config in working])[0]
+    results["indicators_planned"] = best_of(args.repeat, lambda: IndicatorPlan(working).compute(df))[0]
+    return results
+
+
+def bench_backtest(df, args):
+    long_signal, short_signal, exit_signal = random_signals(df.index, seed=args.seed)
+    results = {}
+    elapsed, array_result = best_of(args.repeat, lambda: backtest(df, long_signal, short_signal, exit_signal, stop_loss_pct=1.0, take_profit_pct=2.0))
+    results["backtest_array"] = elapsed
+    results["backtest_array_lean"] = best_of(args.repeat, lambda: backtest(df, long_signal, short_signal, exit_signal, stop_loss_pct=1.0, take_profit_pct=2.0, lean=True))[0]
+    elapsed, sparse_result = best_of(args.repeat, lambda: backtest(df, long_signal, short_signal, exit_signal, stop_loss_pct=1.0, take_profit_pct=2.0, engine="sparse"))
+    results["backtest_sparse"] = elapsed
+    if not np.array_equal(array_result["equity"].to_numpy(), sparse_result["equity"].to_numpy()):
+        raise AssertionError("Array and sparse backtest engines produced different equity curves")
+
+    if len(df) <= args.loop_max_bars:
+        elapsed, loop_result = best_of(1, lambda: backtest(df, long_signal, short_signal, exit_signal, stop_loss_pct=1.0, take_profit_pct=2.0, engine="loop"))
+        results["backtest_loop"] = elapsed
+        if not np.array_equal(array_result["equity"].to_numpy(), loop_result["equity"].to_numpy()):
+            raise AssertionError("Array and loop backtest engines produced different equity curves")
+
+    k = args.batch_columns
+    rng = np.random.default_rng(args.seed)
+    n = len(df)
+    if n * k <= args.batch_max_cells:
+        matrices = [rng.random((n, k)) < 0.01 for _ in range(3)]
+        elapsed, batch_result = best_of(1, lambda: backtest_batch(df, *matrices, stop_loss_pct=1.0))
+        results[f"backtest_batch_{k}"] = elapsed
+        # The same K signal sets as K separate backtest() calls, which the
+        # batch has to beat.
+        columns = [[pd.Series(values[:, j], index=df.index) for values in matrices] for j in range(k)]
+        elapsed, serial = best_of(1, lambda: [backtest(df, *signals, stop_loss_pct=1.0, lean=True)["equity"] for signals in columns])
+        results[f"backtest_serial_{k}"] = elapsed
+        if not np.array_equal(batch_result["equity"].to_numpy(), np.column_stack(serial)):
+            raise AssertionError("Batch and serial backtests produced different equity curves")
+    return results
+
+
+def bench_metrics(df, args):
+    long_signal, short_signal, exit_signal = random_signals(df.index, seed=args.seed)
+    result = backtest(df, long_signal, short_signal, exit_signal)
+    equity = result["equity"].to_numpy()
+    return {
+        "metrics": best_of(args.repeat, lambda: _build_result(df, equity, result["trades"], 10000))[0],
+        "metrics_lean": best_of(args.repeat, lambda: _build_result(df, equity, result["trades"], 10000, lean=True))[0],
+        "trade_log_frame": best_of(1, lambda: result["trades"].to_frame())[0],
+    }
+
+
+def bench_plots(df, args):
+    if len(df) > args.plot_max_bars:
+        return {}
+    long_signal, short_signal, exit_signal = random_signals(df.index, seed=args.seed)
+    result = backtest(df, long_signal, short_signal, exit_signal)
+    frame = df[["Close"]].assign(SMA=df["Close"].rolling(20).mean())
+
+    # Timed through JSON serialisation, which is what Streamlit ships to the
+    # browser, at full resolution and with the default point budget.
+    results = {}
+    for mode, max_points in [("", None), ("_lttb", MAX_POINTS)]:
+        elapsed, payload = best_of(1, lambda: plot_all_indicators(frame, result["trades"], max_points=max_points).to_json())
+        results[f"plot_all_indicators{mode}"] = elapsed
+        results[f"plot_all_indicators{mode}_payload_bytes"] = len(payload)
+        elapsed, payload = best_of(1, lambda: plot_equity_curve(result["equity"], max_points=max_points).to_json())
+        results[f"plot_equity_curve{mode}"] = elapsed
+        results[f"plot_equity_curve{mode}_payload_bytes"] = len(payload)
+    results["plot_all_indicators_minmax"] = best_of(1, lambda: plot_all_indicators(frame, result["trades"], method="minmax").to_json())[0]
+    results["plot_pnl_histogram"] = best_of(1, lambda: plot_pnl_histogram(result["trade_pnls"]))[0]
+    return results
+
+
+def bench_optimiser(df, args):
+    if len(df) > args.optimiser_max_bars:
+        return {}
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    frame = df.copy()
+    for col, series in compute_indicators(frame, STRATEGY_CONFIGS[0]).items():
+        frame[col] = series
+
+    results = {}
+    for workers in args.workers:
+        # Worker counts this machine can't run are recorded as gaps rather than
+        # left out, so the report and the regression check both show them.
+        if workers > (os.cpu_count() or 1):
+            results[f"optimiser_trial_seconds_{workers}w"] = None
+            results.setdefault("notes", {})[f"optimiser_trial_seconds_{workers}w"] = f"skipped: cpu_count={os.cpu_count()}"
+            continue
+        indicator_cache.clear()
+        elapsed, _ = best_of(1, lambda: bayesian_optimiser(frame, STRATEGY_CONFIGS, LONG_EXPR, SHORT_EXPR, EXIT_EXPR, n_trials=args.trials, n_jobs=workers))
+        results[f"optimiser_trial_seconds_{workers}w"] = elapsed / args.trials
+    indicator_cache.clear()
+    elapsed, _ = best_of(1, lambda: bayesian_optimiser(frame, STRATEGY_CONFIGS, LONG_EXPR, SHORT_EXPR, EXIT_EXPR, n_trials=args.trials, pruner="median"))
+    results["optimiser_trial_seconds_pruned"] = elapsed / args.trials
+
+    # A trial stopped at its first checkpoint (10% of the bars) should cost
+    # about a tenth of a full one.
+    study = optuna.create_study(direction="maximize", pruner=_AlwaysPrune())
+    pruned_objective = _make_objective(frame, STRATEGY_CONFIGS, LONG_EXPR, SHORT_EXPR, EXIT_EXPR, None, checkpoints=10)
+    def first_checkpoint():
+        try:
+            pruned_objective(study.ask())
+        except optuna.TrialPruned:
+            pass
+    results["optimiser_first_checkpoint_seconds"] = best_of(args.repeat, first_checkpoint)[0]
+
+    # Peak allocation of a single trial, which should not grow with the frame
+    # beyond the trial's own indicator and signal arrays.
+    objective = _make_objective(frame, STRATEGY_CONFIGS, LONG_EXPR, SHORT_EXPR, EXIT_EXPR, None)
+    fixed_trial = optuna.trial.FixedTrial({"sma_period": 30})
+    objective(fixed_trial)
+    tracemalloc.start()
+    objective(fixed_trial)
+    results["optimiser_trial_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return results
+
+
+class _AlwaysPrune(optuna.pruners.BasePruner):
+    def prune(self, study, trial):
+        return True
+
+
+def bench_portfolio(df, args):
+    k = args.portfolio_assets
+    n = len(df)
+    if n * k > args.portfolio_max_cells:
+        return {}
+    rng = np.random.default_rng(args.seed)
+    # Each asset is the synthetic close with its own random-walk multiplier.
+    prices = pd.DataFrame(df["Close"].to_numpy()[:, None] * np.exp(np.cumsum(rng.normal(0.0, 0.001, (n, k)), axis=0)), index=df.index)
+    longs, shorts, exits = (rng.random((n, k)) < p for p in (0.02, 0.01, 0.05))
+    elapsed, _ = best_of(1, lambda: portfolio_backtest(prices, longs, shorts, exits, initial_capital=1_000_000, max_positions=50, stop_loss_pct=5.0))
+    return {f"portfolio_{k}_assets": elapsed}
+
+
+def bench_streaming(df, args):
+    # Per-bar cost of the streaming path, which should stay flat as the
+    # history grows, checked against the batch equity on the same bars.
+    bars = df.iloc[:args.streaming_bars]
+    records = bars.to_dict("records")
+    strategy = StreamingStrategy(STRATEGY_CONFIGS, LONG_EXPR, SHORT_EXPR, EXIT_EXPR)
+    start = time.perf_counter()
+    equity = [strategy.update(bar, timestamp)["equity"] for timestamp, bar in zip(bars.index, records)]
+    elapsed = time.perf_counter() - start
+
+    frame = bars.assign(**compute_indicators(bars, STRATEGY_CONFIGS[0]))
+    signals = [compile_expr(expr).validate(frame.columns)(frame) for expr in (LONG_EXPR, SHORT_EXPR, EXIT_EXPR)]
+    if not np.array_equal(np.asarray(equity), backtest(frame, *signals, lean=True)["equity"]):
+        raise AssertionError("Streaming replay and batch backtest produced different equity curves")
+    return {"streaming_bar_seconds": elapsed / len(records)}
+
+
+def bench_chunked(df, args):
+    # Out-of-core run over the same bars written to parquet, against the
+    # in-memory path. Peak traced allocation should follow the chunk size;
+    # it is measured on a second run since tracing slows the loops down.
+    frame = df.assign(**compute_indicators(df, STRATEGY_CONFIGS[0]))
+    signals = [compile_expr(expr).validate(frame.columns)(frame) for expr in (LONG_EXPR, SHORT_EXPR, EXIT_EXPR)]
+    expected = backtest(frame, *signals, lean=True)["equity"]
+    del frame, signals
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bars.parquet")
+        write_bar_file(df, path, row_group_size=args.chunk_size)
+        run = lambda: chunked_backtest(path, STRATEGY_CONFIGS, LONG_EXPR, SHORT_EXPR, EXIT_EXPR, os.path.join(tmp_dir, "out"), chunk_size=args.chunk_size)
+        results["chunked_backtest"], result = best_of(1, run)
+        if not np.array_equal(pd.read_parquet(result["equity_path"])["equity"].to_numpy(), expected):
+            raise AssertionError("Chunked and in-memory backtests produced different equity curves")
+        results["chunked_backtest_peak_bytes"] = _peak_bytes(run)
+
+    def in_memory():
+        frame = df.assign(**compute_indicators(df, STRATEGY_CONFIGS[0]))
+        signals = [compile_expr(expr).validate(frame.columns)(frame) for expr in (LONG_EXPR, SHORT_EXPR, EXIT_EXPR)]
+        return backtest(frame, *signals)
+    results["in_memory_backtest_peak_bytes"] = _peak_bytes(in_memory)
+    return results
+
+
+def _peak_bytes(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_price_store(df, args):
+    # Loading the bars and computing every working indicator: from the parquet
+    # cache with the old dropna + astype copy of every input, from the parquet
+    # cache with input_values(), and from the memory-mapped store.
+    # input_copies counts tulipy input arrays allocated rather than viewed.
+    # Arrow allocations are invisible to tracemalloc, hence the RSS deltas.
+    working = []
+    for config in indicators_list:
+        try:
+            compute_indicators(df.iloc[:1000], config)
+            working.append(config)
+        except Exception:
+            pass
+
+    def copied_inputs(frame, col):
+        return frame[col].dropna().values.astype(np.float64)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OHLCVCache(tmp_dir)
+        cache.store("SYN", "1m", df, None)
+        store = PriceStore(os.path.join(tmp_dir, "store"))
+        store.write("SYN", "1m", df)
+        load_parquet = lambda: cache.load("SYN", "1m")[0]
+        load_store = lambda: store.load("SYN", "1m")
+        results["parquet_load"] = best_of(args.repeat, load_parquet)[0]
+        results["price_store_load"] = best_of(args.repeat, load_store)[0]
+
+        for name, load, get_input in [("parquet_copy", load_parquet, copied_inputs), ("parquet", load_parquet, None), ("price_store", load_store, None)]:
+            def run():
+                frame = load()
+                copies = 0
+                for config in working:
+                    inputs = [get_input(frame, col) if get_input else input_values(frame[col]) for col in config["inputs"]]
+                    copies += sum(not np.shares_memory(values, frame[col].to_numpy()) for values, col in zip(inputs, config["inputs"]))
+                    getattr(tp, config["name"])(*inputs, **config["params"])
+                return copies
+
+            rss_before = _rss_bytes()
+            tracemalloc.start()
+            start = time.perf_counter()
+            results[f"{name}_input_copies"] = run()
+            results[f"{name}_indicators"] = time.perf_counter() - start
+            results[f"{name}_peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[f"{name}_rss_delta_bytes"] = None if rss_before is None else _rss_bytes() - rss_before
+    return results
+
+
+def bench_monte_carlo(df, args):
+    # Trade shuffles and bootstraps at --mc-paths paths, and block-bootstrapped
+    # bar returns (timed per path, with the number of paths capped so a run
+    # draws at most --mc-max-values values), against a per-path loop that
+    # shuffles the same trades through pandas.
+    result = backtest(df, *random_signals(df.index, seed=args.seed), lean=True)
+    results = {}
+    for method in ("shuffle", "bootstrap"):
+        results[f"monte_carlo_{method}"] = best_of(1, lambda: monte_carlo(result, method, paths=args.mc_paths, seed=args.seed))[0]
+    block_paths = max(1, min(args.mc_paths, args.mc_max_values // len(df)))
+    results["monte_carlo_block_path_seconds"] = best_of(1, lambda: monte_carlo(result, "block", paths=block_paths, seed=args.seed))[0] / block_paths
+
+    loop_paths = min(args.mc_paths, 100)
+    def loop():
+        rng = np.random.default_rng(args.seed)
+        for _ in range(loop_paths):
+            equity = pd.Series(10000 + np.cumsum(rng.permutation(result["trade_pnls"])))
+            returns = equity.pct_change().dropna()
+            calculate_max_drawdown(equity)
+            returns.mean() / returns.std() * np.sqrt(252)
+    results["monte_carlo_loop_path_seconds"] = best_of(1, loop)[0] / loop_paths
+    return results
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+STAGES = {
+    "fetch": bench_fetch,
+    "indicators": bench_indicators,
+    "backtest": bench_backtest,
+    "metrics": bench_metrics,
+    "plots": bench_plots,
+    "optimiser": bench_optimiser,
+    "portfolio": bench_portfolio,
+    "streaming": bench_streaming,
+    "chunked": bench_chunked,
+    "price_store": bench_price_store,
+    "monte_carlo": bench_monte_carlo,
+}
+
+
+def run(args):
+    results = {}
+    notes = {}
+    for size in args.sizes:
+        df = generate_ohlcv(size, seed=args.seed)
+        results[str(size)] = {}
+        for stage in args.stages:
+            print(f"[{size} bars] {stage}...", file=sys.stderr)
+            stage_results = STAGES[stage](df, args)
+            if "notes" in stage_results:
+                notes.setdefault(str(size), {}).update(stage_results.pop("notes"))
+            results[str(size)].update(stage_results)
+        del df
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+        "notes": notes,
+    }
+
+
+def compare(current, baseline, threshold, stage_thresholds):
+    # Every recorded value is "lower is better" (seconds or bytes), which keeps
+    # the check a single comparison.
+    regressions = []
+    for size, stages in current["results"].items():
+        for stage, value in stages.items():
+            base = baseline.get("results", {}).get(size, {}).get(stage)
+            note = current.get("notes", {}).get(size, {}).get(stage)
+            if value is None and (note is not None or base is not None):
+                base_text = "-" if base is None else f"{base:.6g}"
+                print(f"{'SKIPPED':>10}  {size:>10}  {stage:<36} {base_text:>14} -> {'-':>14}  ({note or 'no value'})")
+                continue
+            if value is None or base is None or base <= 0:
+                continue
+            change = (value - base) / base * 100
+            limit = stage_thresholds.get(stage, threshold)
+            status = "REGRESSION" if change > limit else "ok"
+            print(f"{status:>10}  {size:>10}  {stage:<36} {base:>14.6g} -> {value:>14.6g}  ({change:+.1f}%, limit {limit:.0f}%)")
+            if change > limit:
+                regressions.append((size, stage))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backtesting pipeline on synthetic OHLCV data.")
+    parser.add_argument("--sizes", type=lambda s: [int(v) for v in s.split(",")], default=DEFAULT_SIZES)
+    parser.add_argument("--stages", type=lambda s: s.split(","), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trials", type=int, default=40)
+    parser.add_argument("--workers", type=lambda s: [int(v) for v in s.split(",")], default=[1, 2, 4, 8])
+    parser.add_argument("--batch-columns", type=int, default=64)
+    parser.add_argument("--batch-max-cells", type=int, default=100_000_000)
+    parser.add_argument("--loop-max-bars", type=int, default=1_000_000)
+    parser.add_argument("--plot-max-bars", type=int, default=1_000_000)
+    parser.add_argument("--optimiser-max-bars", type=int, default=1_000_000)
+    parser.add_argument("--portfolio-assets", type=int, default=500)
+    parser.add_argument("--portfolio-max-cells", type=int, default=50_000_000)
+    parser.add_argument("--streaming-bars", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--mc-paths", type=int, default=10_000)
+    parser.add_argument("--mc-max-values", type=int, default=200_000_000)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results.json"))
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits non-zero on regressions.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown in percent.")
+    parser.add_argument("--stage-threshold", action="append", default=[], metavar="STAGE=PCT")
+    args = parser.parse_args(argv)
+
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        stage_thresholds = {}
+        for item in args.stage_threshold:
+            stage, pct = item.split("=", 1)
+            stage_thresholds[stage] = float(pct)
+        regressions = compare(report, baseline, args.threshold, stage_thresholds)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed past the threshold", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+
+def generate_ohlcv(n_bars, seed=0, freq="1min", start="2000-01-03", start_price=100.0, volatility=0.001):
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0.0, volatility, n_bars)))
+    open_ = np.empty(n_bars)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+
+    wick = np.abs(rng.normal(0.0, volatility / 2, (2, n_bars)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.integers(1_000, 100_000, n_bars).astype(np.float64)
+
+    index = pd.date_range(start, periods=n_bars, freq=freq, name="Datetime")
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index)
+
+
+def random_signals(index, seed=0, probability=0.01):
+    rng = np.random.default_rng(seed)
+    n = len(index)
+    return tuple(pd.Series(rng.random(n) < probability, index=index) for _ in range(3))
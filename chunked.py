@@ -0,0 +1,216 @@
+import os
+import json
+import math
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from backtest_engine import _run_array
+from streaming import StreamingIndicator, BacktestState
+from strategy_compiler import compile_expr
+from profiling import timed, count
+
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+def _output_schemas(tz=None):
+    # Equity and trades timestamps keep the bar file's timezone.
+    timestamp = pa.timestamp("us", tz=tz)
+    equity = pa.schema([("timestamp", timestamp), ("equity", pa.float64())])
+    trades = pa.schema([
+        ("Entry Time", timestamp),
+        ("Exit Time", timestamp),
+        ("Type", pa.string()),
+        ("Entry Price", pa.float64()),
+        ("Exit Price", pa.float64()),
+        ("Shares", pa.float64()),
+        ("PnL", pa.float64()),
+    ])
+    return equity, trades
+
+
+def write_bar_file(data, path, row_group_size=DEFAULT_CHUNK_SIZE):
+    # Parquet reads a row group at a time, so the row group size bounds how
+    # much of the file is in memory while it is streamed back in chunks.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(data), tmp_path, row_group_size=row_group_size)
+    os.replace(tmp_path, path)
+
+
+def iter_bar_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    # Yields consecutive OHLCV frames of at most chunk_size bars from a parquet
+    # file (e.g. one written by write_bar_file or OHLCVCache), with the
+    # timestamp index restored from the file's pandas metadata.
+    bar_file = pq.ParquetFile(path)
+    index_columns = _index_columns(bar_file)
+    if columns is not None:
+        columns = index_columns + [col for col in columns if col not in index_columns]
+    for batch in bar_file.iter_batches(batch_size=chunk_size, columns=columns):
+        chunk = batch.to_pandas()
+        if len(chunk):
+            yield chunk
+
+
+def _bar_file_tz(path):
+    bar_file = pq.ParquetFile(path)
+    index_columns = _index_columns(bar_file)
+    if not index_columns:
+        return None
+    index_type = bar_file.schema_arrow.field(index_columns[0]).type
+    return index_type.tz if pa.types.is_timestamp(index_type) else None
+
+
+def _index_columns(bar_file):
+    return [col for col in json.loads((bar_file.schema_arrow.metadata or {}).get(b"pandas", b"{}")).get("index_columns", []) if isinstance(col, str)]
+
+
+class _RunningMetrics:
+    # The metrics of fused_metrics() accumulated chunk by chunk: per-chunk
+    # return moments are merged with Chan's parallel formula, so the Sharpe
+    # and Sortino ratios agree with the in-memory numbers to rounding, and the
+    # running peak carries max drawdown over exactly.
+    def __init__(self, initial_capital):
+        self.initial_capital = initial_capital
+        self.moments = (0, 0.0, 0.0)
+        self.downside = (0, 0.0, 0.0)
+        self.peak = -math.inf
+        self.max_drawdown = math.nan
+        self.last_equity = None
+        self.first_time = None
+        self.last_time = None
+        self.num_trades = 0
+        self.num_wins = 0
+
+    def update(self, index, equity, pnls):
+        if self.last_equity is None:
+            self.first_time = index[0]
+        else:
+            equity = np.concatenate(([self.last_equity], equity))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = equity[1:] / equity[:-1] - 1
+        returns = returns[~np.isnan(returns)]
+        self.moments = _merge_moments(self.moments, returns)
+        self.downside = _merge_moments(self.downside, returns[returns < 0])
+
+        cumulative_max = np.maximum(np.maximum.accumulate(equity), self.peak)
+        drawdown = (equity - cumulative_max) / cumulative_max
+        self.max_drawdown = np.fmin(self.max_drawdown, np.fmin.reduce(drawdown))
+        self.peak = cumulative_max[-1]
+
+        self.last_equity = equity[-1]
+        self.last_time = index[-1]
+        self.num_trades += len(pnls)
+        self.num_wins += int(np.count_nonzero(pnls > 0))
+
+    def result(self):
+        # Same NaN conventions as fused_metrics(): too few returns give a NaN
+        # standard deviation, which then propagates into the ratio.
+        count, mean, m2 = self.moments
+        std = math.sqrt(m2 / (count - 1)) if count > 1 else math.nan
+        sharpe = mean / std * np.sqrt(252) if count > 0 and std != 0 else 0.0
+
+        downside_count, _, downside_m2 = self.downside
+        downside_std = math.sqrt(downside_m2 / (downside_count - 1)) if downside_count > 1 else math.nan
+        sortino = mean / downside_std * np.sqrt(252) if downside_std != 0 else 0.0
+
+        years = (self.last_time - self.first_time).days / 365.25 if self.first_time is not None else 0
+        cagr = (self.last_equity / self.initial_capital) ** (1 / years) - 1 if years > 0 else 0.0
+        max_dd = self.max_drawdown
+        return {
+            'total_return': self.last_equity - self.initial_capital,
+            'CAGR': cagr,
+            'sharpe_ratio': sharpe,
+            'num_trades': self.num_trades,
+            'win_percentage': self.num_wins / self.num_trades * 100 if self.num_trades > 0 else 0.0,
+            'max_drawdown': max_dd,
+            'sortino': sortino,
+            'calmar': cagr / abs(max_dd) if max_dd != 0 else 0.0
+        }
+
+
+def _merge_moments(moments, values):
+    count, mean, m2 = moments
+    n = len(values)
+    if n == 0:
+        return moments
+    values_mean = values.mean()
+    deviation = values - values_mean
+    values_m2 = float(np.dot(deviation, deviation))
+    total = count + n
+    delta = values_mean - mean
+    return total, mean + delta * n / total, m2 + values_m2 + delta * delta * count * n / total
+
+
+def chunked_backtest(path, configs, long_expr, short_expr, exit_expr, output_dir, chunk_size=DEFAULT_CHUNK_SIZE, initial_capital=10000, position_size=0.95, stop_loss_pct=0.0, take_profit_pct=0.0, log=None):
+    # backtest() over a bar file that need not fit in memory. Chunks are read
+    # one at a time; indicator kernels (see streaming.py) and the backtest
+    # state carry across chunk boundaries, so equity and trades are the same
+    # as get_indicators() + backtest() on the whole frame. Equity and closed
+    # trades are appended to output_dir/equity.parquet and trades.parquet as
+    # each chunk finishes; metrics are accumulated alongside and returned.
+    indicators = [StreamingIndicator(config) for config in configs]
+    columns = ["Open", "High", "Low", "Close", "Volume"] + [col for indicator in indicators for col in indicator.columns]
+    conditions = [compile_expr(expr).validate(columns) for expr in (long_expr, short_expr, exit_expr)]
+    inputs = sorted({"Close"} | {col for indicator in indicators for col in indicator.inputs} | {col for condition in conditions for col in condition.columns if col in columns[:5]})
+
+    state = BacktestState(initial_capital, position_size, stop_loss_pct, take_profit_pct)
+    checkpoint = state.checkpoint()
+    metrics = _RunningMetrics(initial_capital)
+    os.makedirs(output_dir, exist_ok=True)
+    equity_path = os.path.join(output_dir, "equity.parquet")
+    trades_path = os.path.join(output_dir, "trades.parquet")
+
+    equity_schema, trades_schema = _output_schemas(_bar_file_tz(path))
+    bars = 0
+    with pq.ParquetWriter(equity_path, equity_schema) as equity_writer, pq.ParquetWriter(trades_path, trades_schema) as trades_writer:
+        for chunk in iter_bar_chunks(path, chunk_size, columns=inputs):
+            with timed("chunked.indicators"):
+                for indicator in indicators:
+                    for col, values in indicator.run(chunk).items():
+                        chunk[col] = values
+            with timed("chunked.simulate"):
+                signals = [condition(chunk) for condition in conditions]
+                equity, trades = _run_array(chunk, *signals, initial_capital, position_size, stop_loss_pct, take_profit_pct, state=checkpoint)
+
+            with timed("chunked.write"):
+                index = chunk.index
+                equity_writer.write_table(pa.table({"timestamp": pa.array(index.as_unit("us")), "equity": equity}, schema=equity_schema))
+                if len(trades):
+                    trades_writer.write_table(pa.Table.from_pandas(_trade_frame(trades, index, bars, checkpoint), schema=trades_schema, preserve_index=False))
+                metrics.update(index, equity, trades.pnls)
+
+            # A position still open at the end of the chunk needs its entry
+            # time once the rows it was entered on are gone.
+            if checkpoint["position"] != 0 and checkpoint["entry_bar"] >= bars:
+                checkpoint["entry_time"] = index[checkpoint["entry_bar"] - bars]
+            bars += len(chunk)
+            count("chunked.bars", len(chunk))
+            if log is not None:
+                log(f"{bars:,} bars, {metrics.num_trades:,} trades")
+
+    if bars == 0:
+        raise ValueError(f"No bars in '{path}'")
+    result = metrics.result()
+    result.update({"bars": bars, "equity_path": equity_path, "trades_path": trades_path, "state": BacktestState.from_checkpoint(checkpoint)})
+    return result
+
+
+def _trade_frame(trades, index, offset, checkpoint):
+    # Trade bar numbers are global; entries before this chunk can only be the
+    # position carried in, whose entry time the checkpoint kept.
+    entry_bars = trades.column("entry_bar") - offset
+    carried = entry_bars < 0
+    entry_times = index[np.where(carried, 0, entry_bars)].as_unit("us")
+    if carried.any():
+        entry_times = entry_times.where(~carried, checkpoint["entry_time"])
+    side = trades.column("side")
+    return pd.DataFrame({
+        "Entry Time": entry_times,
+        "Exit Time": index[trades.column("exit_bar") - offset].as_unit("us"),
+        "Type": np.where(side == 1, "Long", "Short"),
+        "Entry Price": trades.column("entry_price"),
+        "Exit Price": trades.column("exit_price"),
+        "Shares": trades.column("shares"),
+        "PnL": trades.column("pnl")
+    })
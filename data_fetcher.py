@@ -1,11 +1,207 @@
+import os
+import re
+import json
 import yfinance as yf
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 
-def fetch_data(ticker, period='60d', interval='1d'):
+CACHE_DIR = os.environ.get("BACKTESTER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "backtester"))
+
+EARLIEST = pd.Timestamp("1970-01-01", tz="UTC")
+
+INTERVAL_DELTAS = {
+    "1m": pd.Timedelta(minutes=1),
+    "2m": pd.Timedelta(minutes=2),
+    "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15),
+    "30m": pd.Timedelta(minutes=30),
+    "60m": pd.Timedelta(hours=1),
+    "90m": pd.Timedelta(minutes=90),
+    "1h": pd.Timedelta(hours=1),
+    "1d": pd.Timedelta(days=1),
+    "5d": pd.Timedelta(days=5),
+    "1wk": pd.Timedelta(weeks=1),
+    "1mo": pd.Timedelta(days=28),
+    "3mo": pd.Timedelta(days=84),
+}
+
+
+class DataProvider:
+    # Providers return an OHLCV frame indexed by bar timestamp, either for a
+    # yfinance-style period ("60d", "1y", ...) or for every bar from `start` on.
+    def download(self, ticker, interval, period=None, start=None):
+        raise NotImplementedError
+
+
+class YFinanceProvider(DataProvider):
+    def download(self, ticker, interval, period=None, start=None):
+        window = {"start": start} if start is not None else {"period": period}
+        return yf.download(ticker, interval=interval, multi_level_index=False, progress=False, **window)
+
+
+class DataFrameProvider(DataProvider):
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = []
+
+    def download(self, ticker, interval, period=None, start=None):
+        self.calls.append({"ticker": ticker, "interval": interval, "period": period, "start": start})
+        data = self.frames[(ticker, interval)]
+        if start is not None:
+            return data[data.index >= start]
+        return slice_period(data, period)
+
+
+class OHLCVCache:
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+
+    def path(self, ticker, interval):
+        safe_ticker = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+        return os.path.join(self.root, interval, f"{safe_ticker}.parquet")
+
+    def load(self, ticker, interval):
+        # Returns the bars and the cache metadata: covered_from (the earliest
+        # requested start the file is complete from) and fetched_at (when the
+        # provider was last asked for new bars).
+        path = self.path(ticker, interval)
+        if not os.path.exists(path):
+            return None, {"covered_from": None, "fetched_at": None}
+        table = pq.read_table(path)
+        return table.to_pandas(), _cache_meta(table.schema)
+
+    def metadata(self, ticker, interval):
+        # load()'s metadata without reading the bars (only the parquet footer).
+        path = self.path(ticker, interval)
+        if not os.path.exists(path):
+            return {"covered_from": None, "fetched_at": None}
+        return _cache_meta(pq.read_schema(path))
+
+    def store(self, ticker, interval, data, covered_from, fetched_at=None):
+        path = self.path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(data)
+        meta = dict(table.schema.metadata or {})
+        meta[b"backtester"] = json.dumps({
+            "covered_from": covered_from.isoformat() if covered_from is not None else None,
+            "fetched_at": fetched_at.isoformat() if fetched_at is not None else None,
+        }).encode()
+        tmp_path = path + ".tmp"
+        pq.write_table(table.replace_schema_metadata(meta), tmp_path)
+        os.replace(tmp_path, path)
+
+
+def _cache_meta(schema):
+    meta = json.loads((schema.metadata or {}).get(b"backtester", b"{}"))
+    return {key: pd.Timestamp(meta[key]) if meta.get(key) else None for key in ("covered_from", "fetched_at")}
+
+
+default_provider = YFinanceProvider()
+default_cache = OHLCVCache()
+
+
+def fetch_data(ticker, period='60d', interval='1d', provider=None, cache=None, use_cache=True):
+    provider = provider or default_provider
+    cache = cache or default_cache
     try:
-        data = yf.download(ticker, period=period, interval=interval, multi_level_index=False)
-        return data
+        if not use_cache:
+            return provider.download(ticker, interval, period=period)
+
+        cached, meta = cache.load(ticker, interval)
+        covered_from = meta["covered_from"]
+        now = pd.Timestamp.now(tz="UTC")
+        requested_from = period_start(period, now)
+        if requested_from is None:
+            requested_from = EARLIEST
+
+        if cached is None or cached.empty or not _covers(covered_from, requested_from):
+            fresh = provider.download(ticker, interval, period=period)
+            if fresh is None or fresh.empty:
+                return fresh if cached is None else slice_period(cached, period)
+            data = _merge(cached, fresh)
+            covered_from = _earliest(covered_from, requested_from)
+            cache.store(ticker, interval, data, covered_from, fetched_at=now)
+        elif _is_stale(cached.index[-1], meta["fetched_at"], interval, now):
+            # The last cached bar may have been incomplete, so it is re-fetched
+            # along with everything after it and the fresh copy wins the merge.
+            fresh = provider.download(ticker, interval, start=cached.index[-1])
+            data = _merge(cached, fresh)
+            cache.store(ticker, interval, data, covered_from, fetched_at=now)
+        else:
+            data = cached
+
+        return slice_period(data, period)
     except Exception as e:
-        print(f"Error fetching data for {ticker}: {e}")
\ No newline at end of file
+        print(f"Error fetching data for {ticker}: {e}")
+
+
+def period_start(period, now=None):
+    now = now if now is not None else pd.Timestamp.now(tz="UTC")
+    if period is None or period == "max":
+        return None
+    if period == "ytd":
+        return now.normalize().replace(month=1, day=1)
+
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if match is None:
+        raise ValueError(f"Unsupported period '{period}'")
+    value, unit = int(match.group(1)), match.group(2)
+    offsets = {
+        "d": pd.Timedelta(days=value),
+        "wk": pd.Timedelta(weeks=value),
+        "mo": pd.DateOffset(months=value),
+        "y": pd.DateOffset(years=value),
+    }
+    return now - offsets[unit]
+
+
+def slice_period(data, period):
+    start = period_start(period)
+    if start is None or data is None or data.empty:
+        return data
+    if data.index.tz is None:
+        start = start.tz_convert(None)
+    else:
+        start = start.tz_convert(data.index.tz)
+    # Bars are kept sorted, so this is a positional slice rather than a
+    # boolean mask (which would copy every column).
+    return data.iloc[data.index.searchsorted(start):]
+
+
+def _merge(cached, fresh):
+    if cached is None or cached.empty:
+        return fresh.sort_index()
+    if fresh is None or fresh.empty:
+        return cached
+    merged = pd.concat([cached, fresh])
+    return merged[~merged.index.duplicated(keep="last")].sort_index()
+
+
+def _is_stale(last_bar, fetched_at, interval, now):
+    # The cached bars can be behind the provider when the last bar was still
+    # open when it was fetched (it has kept changing since, e.g. a daily bar
+    # fetched mid-session), or when a whole interval has passed since the
+    # fetch (new bars may have started). Caches written before fetched_at was
+    # recorded are refreshed once.
+    delta = INTERVAL_DELTAS.get(interval, pd.Timedelta(0))
+    if fetched_at is None:
+        return True
+    return fetched_at < _to_utc(last_bar) + delta or now - fetched_at >= delta
+
+
+def _covers(covered_from, requested_from):
+    return covered_from is not None and covered_from <= requested_from
+
+
+def _earliest(a, b):
+    if a is None:
+        return b
+    return min(a, b)
+
+
+def _to_utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
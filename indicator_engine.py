@@ -1,6 +1,10 @@
+import hashlib
+import threading
+from collections import OrderedDict
 import tulipy as tp
 import pandas as pd
 import numpy as np
+from profiling import timed, count
 
 
 OUTPUT_MAPPINGS = {
@@ -79,10 +83,184 @@ OUTPUT_MAPPINGS = {
     "sub": ["sub"],
 }
 
-def get_indicators(df, config):
+class IndicatorCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key, series_dict):
+        size = sum(s.values.nbytes + s.index.nbytes for s in series_dict.values())
+        with self._lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (dict(series_dict), size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Module-level so it survives optimiser trials and Streamlit reruns, which
+# re-execute app.py but keep imported modules alive.
+indicator_cache = IndicatorCache()
+
+
+class ColumnOverlay:
+    # Read-only view of a base frame plus extra columns. Lookups fall through to
+    # the base frame, so per-trial indicator columns never copy the OHLCV data.
+    def __init__(self, base):
+        self.base = base
+        self.index = base.index
+        self.extra = {}
+
+    def add(self, name, series):
+        values = np.asarray(series, dtype=np.float64)
+        n = len(self.index)
+        if len(values) < n:
+            padded = np.full(n, np.nan)
+            padded[n - len(values):] = values
+            values = padded
+        self.extra[name] = values
+
+    def alias(self, name, target):
+        self.extra[name] = self.extra[target]
+
+    def slice(self, start, stop):
+        window = ColumnOverlay(self.base.iloc[start:stop])
+        window.extra = {name: values[start:stop] for name, values in self.extra.items()}
+        return window
+
+    def values(self, name):
+        if name in self.extra:
+            return self.extra[name]
+        return self.base[name].to_numpy()
+
+    def __getitem__(self, name):
+        if name in self.extra:
+            return pd.Series(self.extra[name], index=self.index, name=name, copy=False)
+        return self.base[name]
+
+    def __contains__(self, name):
+        return name in self.extra or name in self.base.columns
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def columns(self):
+        return self.base.columns.append(pd.Index([col for col in self.extra if col not in self.base.columns]))
+
+    def to_frame(self):
+        return self.base.assign(**self.extra)
+
+
+def data_fingerprint(df, columns=None):
+    digest = hashlib.blake2b(digest_size=16)
+    index_values = getattr(df.index, "asi8", None)
+    digest.update(str(getattr(df.index, "tz", None)).encode())
+    digest.update(_hashable_bytes(index_values if index_values is not None else df.index.to_numpy()))
+    for col in (columns if columns is not None else df.columns):
+        digest.update(str(col).encode())
+        digest.update(_hashable_bytes(df[col].to_numpy()))
+    return digest.hexdigest()
+
+
+def _hashable_bytes(values):
+    if values.dtype == object:
+        return pd.util.hash_array(values).tobytes()
+    return np.ascontiguousarray(values).tobytes()
+
+
+def indicator_key(fingerprint, config):
+    return (
+        fingerprint,
+        config["name"].lower(),
+        tuple((param, repr(value)) for param, value in config["params"].items()),
+        tuple(config["inputs"]),
+    )
+
+
+def get_indicators(df, config, cache=indicator_cache, fingerprint=None):
+    return get_indicators_many(df, [config], cache, fingerprint)[0]
+
+
+def get_indicators_many(df, configs, cache=indicator_cache, fingerprint=None):
+    # Returns one {column: Series} dict per config. Every config is looked up
+    # in the cache first; the misses are computed together through one
+    # IndicatorPlan, so the EMAs, true range and directional movement they
+    # share run once, and each config's columns are cached under its own key.
+    from indicator_plan import IndicatorPlan  # indicator_plan imports this module
+
+    configs = list(configs)
+    if cache is None:
+        with timed("indicators.compute"):
+            return IndicatorPlan(configs).compute_each(df)
+
+    fingerprints = {}
+    results = [None] * len(configs)
+    missing = {}
+    for i, config in enumerate(configs):
+        inputs = tuple(config["inputs"])
+        if fingerprint is None and inputs not in fingerprints:
+            fingerprints[inputs] = data_fingerprint(df, config["inputs"])
+        key = indicator_key(fingerprint if fingerprint is not None else fingerprints[inputs], config)
+        if key in missing:
+            missing[key].append(i)
+            continue
+        results[i] = cache.get(key)
+        if results[i] is None:
+            missing[key] = [i]
+
+    count("indicators.cache_hits", len(configs) - sum(len(positions) for positions in missing.values()))
+    if missing:
+        count("indicators.cache_misses", len(missing))
+        with timed("indicators.compute"):
+            computed = IndicatorPlan([configs[positions[0]] for positions in missing.values()]).compute_each(df)
+        for (key, positions), series_dict in zip(missing.items(), computed):
+            cache.put(key, series_dict)
+            for i in positions:
+                results[i] = dict(series_dict)
+    return results
+
+
+def compute_indicators(df, config):
+    # A direct tulipy call: the reference the planned arithmetic behind
+    # get_indicators() is tested against (see indicator_plan.py).
     name = config["name"].lower()
     params = config["params"]
-    inputs = [df[input_col].dropna().values.astype(np.float64) for input_col in config["inputs"]]
+    inputs = [input_values(df[input_col]) for input_col in config["inputs"]]
 
     try:
         func = getattr(tp, name)
@@ -92,11 +270,7 @@ def get_indicators(df, config):
     result = func(*inputs, **params)
 
     if isinstance(result, tuple):
-        friendly_names = OUTPUT_MAPPINGS.get(name, [f"{name}_{i}" for i in range(len(result))])
-        columns = [
-            build_col_name(name, params, suffix=friendly_names[i] if i < len(friendly_names) else str(i))
-            for i in range(len(result))
-        ]
+        columns = indicator_column_names(name, params, len(result))
         series_dict = {
             col: pd.Series(res, index=df.index[-len(res):])
             for col, res in zip(columns, result)
@@ -109,6 +283,26 @@ def get_indicators(df, config):
 
     return series_dict
 
+def input_values(series):
+    # Columns that are already float64, contiguous and NaN-free (e.g. the
+    # memory-mapped columns of a PriceStore) go to tulipy as they are; only
+    # the rest pay for dropna + astype. np.min propagates NaN without
+    # allocating a mask.
+    values = series.to_numpy()
+    if values.dtype == np.float64 and values.flags.c_contiguous and len(values) and not np.isnan(values.min()):
+        return values
+    return series.dropna().values.astype(np.float64)
+
+def indicator_column_names(name, params, n_outputs):
+    name = name.lower()
+    if n_outputs == 1:
+        return [build_col_name(name, params)]
+    friendly_names = OUTPUT_MAPPINGS.get(name, [f"{name}_{i}" for i in range(n_outputs)])
+    return [
+        build_col_name(name, params, suffix=friendly_names[i] if i < len(friendly_names) else str(i))
+        for i in range(n_outputs)
+    ]
+
 def build_col_name(name: str, params: dict, suffix=None) -> str:
     param_str = "_".join(str(v) for v in params.values())
     base = f"{name.upper()}_{param_str}" if param_str else name.upper()
@@ -0,0 +1,289 @@
+import numpy as np
+import pandas as pd
+import tulipy as tp
+from indicator_engine import indicator_column_names, input_values
+from profiling import timed, count
+
+
+# Several indicators are built from the same intermediate series: the EMA
+# family (ema, dema, tema, apo, ppo, macd) from EMAs of one input, atr/natr
+# from Wilder-smoothed true range, and di/dx/adx/adxr from smoothed directional
+# movement. IndicatorPlan breaks a selection of indicator configs into a DAG of
+# those primitives, keyed by (primitive, inputs, period), so each one is
+# computed once however many indicators need it, and derives the final columns
+# from them.
+#
+# Derivations reproduce tulipy's arithmetic: ema, apo, ppo, macd, atr, natr
+# and dm come out identical to compute_indicators(); dema, tema, di, dx, adx
+# and adxr differ only in the last bits (tulipy rearranges the same
+# recurrences). Everything else is a single tulipy call node, so duplicate
+# configs and the input columns are still shared. Recipes return None for
+# options tulipy rejects (e.g. apo with short_period > long_period), so the
+# config becomes a plain tulipy node and raises tulipy's InvalidOptionError.
+#
+# compute_indicators() (a direct tulipy call) is the reference;
+# get_indicators() and get_indicators_many() compute through a plan, so
+# cached columns always come from this arithmetic.
+
+
+class IndicatorPlan:
+    def __init__(self, configs):
+        self.configs = list(configs)
+        self.nodes = {}
+        self.outputs = []
+        for config in self.configs:
+            name = config["name"].lower()
+            recipe = RECIPES.get(name)
+            inputs = [self.node(("input", col), _read_input(col)) for col in config["inputs"]]
+            keys = recipe(self, inputs, config["params"]) if recipe is not None else None
+            if keys is None:
+                keys = _plan_tulipy(self, name, inputs, config["params"])
+            self.outputs.append((indicator_column_names(name, config["params"], len(keys)), keys))
+
+    def node(self, key, func, *deps):
+        # Nodes are registered in dependency order, so the dict order is a
+        # valid evaluation order.
+        if key not in self.nodes:
+            self.nodes[key] = (func, deps)
+        return key
+
+    def compute_each(self, df):
+        # One {column: Series} dict per config, in config order.
+        values = {}
+        with timed("indicators.plan"):
+            for key, (func, deps) in self.nodes.items():
+                values[key] = func(df, *(values[dep] for dep in deps))
+            count("indicators.plan_nodes", len(self.nodes))
+
+            results = []
+            for columns, keys in self.outputs:
+                series_dict = {}
+                for col, key in zip(columns, keys):
+                    res = values[key]
+                    if len(res) == 0:
+                        # tulipy rejects inputs too short for a single output bar.
+                        raise tp.InvalidOptionError()
+                    series_dict[col] = pd.Series(res, index=df.index[-len(res):])
+                results.append(series_dict)
+        return results
+
+    def compute(self, df):
+        result = {}
+        for series_dict in self.compute_each(df):
+            result.update(series_dict)
+        return result
+
+
+def plan_indicators(df, configs):
+    return IndicatorPlan(configs).compute(df)
+
+
+def _read_input(col):
+    return lambda df: input_values(df[col])
+
+
+def _plan_tulipy(plan, name, inputs, params):
+    # Any other indicator is one tulipy call over the shared input columns,
+    # as in compute_indicators().
+    try:
+        func = getattr(tp, name)
+    except AttributeError:
+        raise ValueError(f"Indicator function '{name}' not found in Tulipy")
+
+    def call(df, *values):
+        result = func(*values, **params)
+        return result if isinstance(result, tuple) else (result,)
+    key = plan.node(("tulipy", name, *inputs, tuple(params.items())), call, *inputs)
+    return [plan.node(("item", key, i), lambda df, result, i=i: result[i], key) for i in range(len(func.outputs))]
+
+
+def _ema(plan, source, period):
+    return plan.node(("ema", source, period), lambda df, values: tp.ema(values, period), source)
+
+
+def _tail(plan, source, start):
+    return plan.node(("tail", source, start), lambda df, values: values[start:], source)
+
+
+def _ema_chain(plan, source, period, depth):
+    # tulipy seeds each nested EMA of dema/tema on the first bar the outer
+    # one is warmed up, i.e. an EMA over the series from period - 1 on.
+    chain = [_ema(plan, source, period)]
+    for _ in range(depth - 1):
+        chain.append(_ema(plan, _tail(plan, chain[-1], period - 1), period))
+    return chain
+
+
+def _period(params, minimum=1):
+    # None when tulipy would reject the period.
+    period = int(params["period"])
+    return period if period >= minimum else None
+
+
+def _short_long(params):
+    # tulipy's apo/ppo/macd need 1 <= short_period <= long_period, long_period >= 2.
+    short, long = int(params["short_period"]), int(params["long_period"])
+    return (short, long) if 1 <= short <= long and long >= 2 else None
+
+
+def _plan_ema(plan, inputs, params):
+    period = _period(params)
+    if period is None:
+        return None
+    return [_ema(plan, inputs[0], period)]
+
+
+def _plan_dema(plan, inputs, params):
+    period = _period(params)
+    if period is None:
+        return None
+    e1, e2 = _ema_chain(plan, inputs[0], period, 2)
+
+    def dema(df, e1, e2):
+        m = len(e2) - (period - 1)
+        return e1[len(e1) - m:] * 2 - e2[len(e2) - m:]
+    return [plan.node(("dema", inputs[0], period), dema, e1, e2)]
+
+
+def _plan_tema(plan, inputs, params):
+    period = _period(params)
+    if period is None:
+        return None
+    e1, e2, e3 = _ema_chain(plan, inputs[0], period, 3)
+
+    def tema(df, e1, e2, e3):
+        m = len(e3) - (period - 1)
+        return 3 * e1[len(e1) - m:] - 3 * e2[len(e2) - m:] + e3[len(e3) - m:]
+    return [plan.node(("tema", inputs[0], period), tema, e1, e2, e3)]
+
+
+def _plan_apo(plan, inputs, params):
+    periods = _short_long(params)
+    if periods is None:
+        return None
+    short, long = (_ema(plan, inputs[0], period) for period in periods)
+    return [plan.node(("apo", short, long), lambda df, s, l: (s - l)[1:], short, long)]
+
+
+def _plan_ppo(plan, inputs, params):
+    periods = _short_long(params)
+    if periods is None:
+        return None
+    short, long = (_ema(plan, inputs[0], period) for period in periods)
+    return [plan.node(("ppo", short, long), lambda df, s, l: (100 * (s - l) / l)[1:], short, long)]
+
+
+def _plan_macd(plan, inputs, params):
+    periods = _short_long(params)
+    signal_period = int(params["signal_period"])
+    if periods is None or signal_period < 1:
+        return None
+    short_period, long_period = periods
+    if (short_period, long_period) == (12, 26):
+        # tulipy hard-codes 0.15/0.075 smoothing for this pair, which no
+        # integer-period EMA reproduces.
+        return None
+    short = _ema(plan, inputs[0], short_period)
+    long = _ema(plan, inputs[0], long_period)
+    line = plan.node(("macd", short, long), lambda df, s, l: (s - l)[long_period - 1:], short, long)
+    signal = _ema(plan, line, signal_period)
+    histogram = plan.node(("macd_histogram", line, signal), lambda df, m, s: m - s, line, signal)
+    return [line, signal, histogram]
+
+
+def _true_range(plan, inputs):
+    return plan.node(("tr", *inputs), lambda df, h, l, c: tp.tr(h, l, c), *inputs)
+
+
+def _plan_atr(plan, inputs, params):
+    period = _period(params)
+    if period is None:
+        return None
+    tr = _true_range(plan, inputs)
+    return [plan.node(("wilders", tr, period), lambda df, values: tp.wilders(values, period), tr)]
+
+
+def _plan_natr(plan, inputs, params):
+    atr = _plan_atr(plan, inputs, params)
+    if atr is None:
+        return None
+    atr, close = atr[0], inputs[2]
+    return [plan.node(("natr", atr, close), lambda df, a, c: 100 * a / c[-len(a):], atr, close)]
+
+
+def _directional_movement(plan, inputs, period):
+    dm = plan.node(("dm", inputs[0], inputs[1], period), lambda df, h, l: tp.dm(h, l, period), inputs[0], inputs[1])
+    plus = plan.node(("item", dm, 0), lambda df, pair: pair[0], dm)
+    minus = plan.node(("item", dm, 1), lambda df, pair: pair[1], dm)
+    return plus, minus
+
+
+def _plan_dm(plan, inputs, params):
+    period = _period(params)
+    if period is None:
+        return None
+    return list(_directional_movement(plan, inputs, period))
+
+
+def _percent(numerator, denominator):
+    # Flat windows give 0/0 = NaN, as in tulipy, without numpy's warning.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 * numerator / denominator
+
+
+def _plan_di(plan, inputs, params):
+    # tulipy smooths DM and true range with the same sum-form recurrence
+    # (s = s * (period - 1) / period + x, seeded with bars 1..period-1). Wilder's
+    # average over the true range with its first bar zeroed starts from that
+    # seed divided by period, so period * wilders is the smoothed range.
+    period = _period(params)
+    if period is None:
+        return None
+    plus, minus = _directional_movement(plan, inputs, period)
+    tr = _true_range(plan, inputs)
+    smoothed = plan.node(("tr_sum", tr, period), lambda df, values: period * tp.wilders(np.concatenate(([0.0], values[1:])), period), tr)
+    return [
+        plan.node(("di", plus, smoothed), lambda df, dm, s: _percent(dm, s), plus, smoothed),
+        plan.node(("di", minus, smoothed), lambda df, dm, s: _percent(dm, s), minus, smoothed),
+    ]
+
+
+def _plan_dx(plan, inputs, params):
+    period = _period(params)
+    if period is None:
+        return None
+    plus, minus = _directional_movement(plan, inputs, period)
+    return [plan.node(("dx", plus, minus), lambda df, p, m: _percent(np.abs(p - m), p + m), plus, minus)]
+
+
+def _plan_adx(plan, inputs, params):
+    period = _period(params, minimum=2)
+    if period is None:
+        return None
+    dx = _plan_dx(plan, inputs, params)[0]
+    return [plan.node(("wilders", dx, period), lambda df, values: tp.wilders(values, period), dx)]
+
+
+def _plan_adxr(plan, inputs, params):
+    period = _period(params, minimum=2)
+    if period is None:
+        return None
+    adx = _plan_adx(plan, inputs, params)[0]
+    return [plan.node(("adxr", adx, period), lambda df, a: 0.5 * (a[period - 1:] + a[:len(a) - (period - 1)]), adx)]
+
+
+RECIPES = {
+    "ema": _plan_ema,
+    "dema": _plan_dema,
+    "tema": _plan_tema,
+    "apo": _plan_apo,
+    "ppo": _plan_ppo,
+    "macd": _plan_macd,
+    "atr": _plan_atr,
+    "natr": _plan_natr,
+    "dm": _plan_dm,
+    "di": _plan_di,
+    "dx": _plan_dx,
+    "adx": _plan_adx,
+    "adxr": _plan_adxr,
+}
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from profiling import timed, count
+
+
+# Robustness of a backtest result under resampling. Every method draws a whole
+# chunk of paths as one (paths, steps) matrix and scores all of its columns at
+# once, so 10k paths cost a handful of NumPy calls per chunk:
+#   shuffle   - the closed trades' PnLs in a random order (same final equity,
+#               different path and drawdown)
+#   bootstrap - PnLs drawn with replacement from the closed trades
+#   block     - the per-bar returns of the equity curve, resampled in
+#               circular blocks so short-range autocorrelation survives
+# Trade paths step on the original exit times; block paths on the bars. Sharpe
+# on a trade path is therefore per trade (annualised like the bar one), so
+# compare it with 'observed', which is scored the same way.
+METHODS = ("shuffle", "bootstrap", "block")
+
+BAND_PERCENTILES = (5, 25, 50, 75, 95)
+SUMMARY_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Paths per chunk are picked so one chunk's equity matrix holds about this
+# many values (8 MB); scoring allocates a few more of the same size.
+CHUNK_VALUES = 1_000_000
+
+
+def monte_carlo(result, method="shuffle", paths=10_000, block_size=20, chunk_size=None, band_paths=1_000, band_points=2_000, percentiles=BAND_PERCENTILES, seed=None):
+    # result is a backtest() result. Returns per-path metrics ('paths'), their
+    # quantiles ('summary', rows labelled p05 ... p95), the same metrics for
+    # the unresampled path ('observed') and equity percentile bands over time
+    # ('bands', from the first band_paths paths at up to band_points steps).
+    if method not in METHODS:
+        raise ValueError(f"Unknown Monte Carlo method '{method}', expected one of {', '.join(METHODS)}")
+    if paths < 1:
+        raise ValueError("Monte Carlo needs at least one path")
+
+    equity = np.asarray(result['equity'], dtype=np.float64)
+    bar_index = result['equity'].index if isinstance(result['equity'], pd.Series) else result['trades'].index
+    initial_capital = equity[-1] - result['total_return']
+
+    if method == "block":
+        steps = _bar_returns(equity)
+        index = bar_index
+    else:
+        steps = np.asarray(result['trade_pnls'], dtype=np.float64)
+        if len(steps) == 0:
+            raise ValueError("Monte Carlo over trades needs at least one closed trade")
+        # Trade paths start from the first bar and step on each exit time.
+        index = bar_index[np.concatenate(([0], result['trades'].column("exit_bar")))]
+
+    rng = np.random.default_rng(seed)
+    n = len(steps) + 1
+    if chunk_size is None:
+        chunk_size = max(1, CHUNK_VALUES // n)
+    band_rows = np.unique(np.linspace(0, n - 1, min(n, band_points)).astype(np.int64))
+    band_samples = []
+    columns = {"final_equity": [], "max_drawdown": [], "sharpe_ratio": [], "CAGR": []}
+
+    for start in range(0, paths, chunk_size):
+        k = min(chunk_size, paths - start)
+        with timed("monte_carlo.paths"):
+            sample = _draw(method, steps, k, block_size, rng)
+            path_equity = _equity(method, sample, initial_capital)
+        with timed("monte_carlo.metrics"):
+            metrics = _path_metrics(method, sample, path_equity, index, initial_capital)
+        for key, values in metrics.items():
+            columns[key].append(values)
+        if start < band_paths:
+            band_samples.append(path_equity[:band_paths - start, band_rows])
+        count("monte_carlo.paths", k)
+
+    frame = pd.DataFrame({key: np.concatenate(values) for key, values in columns.items()})
+    observed = _path_metrics(method, steps[None, :], _equity(method, steps[None, :], initial_capital), index, initial_capital)
+    bands = np.percentile(np.concatenate(band_samples), percentiles, axis=0).T
+
+    # String labels, so the app can stack the 'observed' row under the
+    # quantiles without a mixed float/str index (which Arrow cannot serialise).
+    summary = frame.quantile(list(SUMMARY_QUANTILES))
+    summary.index = pd.Index([f"p{round(q * 100):02d}" for q in SUMMARY_QUANTILES], name="quantile")
+    return {
+        'method': method,
+        'paths': frame,
+        'summary': summary,
+        'probability_of_loss': float(np.mean(frame["final_equity"] < initial_capital)),
+        'observed': {key: values[0] for key, values in observed.items()},
+        'bands': pd.DataFrame(bands, index=index[band_rows], columns=list(percentiles)),
+    }
+
+
+def _bar_returns(equity):
+    if len(equity) < 2:
+        raise ValueError("Monte Carlo over bar returns needs at least two bars")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = equity[1:] / equity[:-1] - 1
+    # A curve through zero (a wiped-out short) has no return for that bar.
+    return np.where(np.isfinite(returns), returns, 0.0)
+
+
+def _draw(method, steps, k, block_size, rng):
+    # A (k, len(steps)) matrix, one resampled path per row. Rows are
+    # contiguous, which keeps the per-path reductions fast for long paths.
+    m = len(steps)
+    if method == "shuffle":
+        return rng.permuted(np.tile(steps, (k, 1)), axis=1)
+    if method == "bootstrap":
+        return steps[rng.integers(0, m, size=(k, m))]
+    block_size = max(1, min(int(block_size), m))
+    blocks = -(-m // block_size)
+    starts = rng.integers(0, m, size=(k, blocks, 1))
+    positions = (starts + np.arange(block_size)) % m
+    return steps[positions.reshape(k, blocks * block_size)[:, :m]]
+
+
+def _equity(method, sample, initial_capital):
+    # Equity paths with the starting capital as the first column: PnLs add
+    # up, bar returns compound.
+    k, m = sample.shape
+    equity = np.empty((k, m + 1))
+    equity[:, 0] = initial_capital
+    if method == "block":
+        np.cumprod(1 + sample, axis=1, out=equity[:, 1:])
+        equity[:, 1:] *= initial_capital
+    else:
+        np.cumsum(sample, axis=1, out=equity[:, 1:])
+        equity[:, 1:] += initial_capital
+    return equity
+
+
+def _path_metrics(method, sample, equity, index, initial_capital):
+    # The subset of fused_metrics() reported per path, with the same
+    # conventions (ddof=1, sqrt(252) annualisation, drawdown from the running
+    # peak) but without the Sortino and drawdown matrices it also builds.
+    if method == "block":
+        returns = sample
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = sample / equity[:, :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = returns.mean(axis=1)
+        std = returns.std(axis=1, ddof=1)
+        sharpe = np.where(std != 0, mean / std * np.sqrt(252), 0.0)
+
+        peak = np.maximum.accumulate(equity, axis=1)
+        np.divide(equity, peak, out=peak)
+        max_dd = peak.min(axis=1) - 1
+
+        years = (index[-1] - index[0]).days / 365.25
+        cagr = (equity[:, -1] / initial_capital) ** (1 / years) - 1 if years > 0 else np.zeros(len(equity))
+    return {"final_equity": equity[:, -1].copy(), "max_drawdown": max_dd, "sharpe_ratio": sharpe, "CAGR": cagr}
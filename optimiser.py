@@ -1,14 +1,284 @@
+import os
+import tempfile
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import optuna
-from backtest_engine import backtest
-from indicator_engine import get_indicators
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from backtest_engine import backtest, backtest_batch
+from strategy_compiler import compile_expr
+from indicator_engine import get_indicators_many, data_fingerprint, indicator_column_names, ColumnOverlay
+from profiling import timed, count
 import pandas as pd
+import numpy as np
+
+def bayesian_optimiser(df, base_configs, long_expr, short_expr, exit_expr, n_trials=50, n_jobs=1, pruner=None, checkpoints=10):
+    fingerprint = data_fingerprint(df)
+    compile_strategy(df, base_configs, (long_expr, short_expr, exit_expr), fingerprint)
+    checkpoints = checkpoints if pruner is not None else None
+
+    # Trials run in worker processes when n_jobs > 1, so only the study as a
+    # whole is timed there.
+    with timed("optimiser.study"):
+        if n_jobs > 1:
+            best_trial = _optimise_parallel(df, base_configs, long_expr, short_expr, exit_expr, n_trials, n_jobs, fingerprint, pruner, checkpoints)
+        else:
+            study = optuna.create_study(direction="maximize", pruner=make_pruner(pruner))
+            study.optimize(_make_objective(df, base_configs, long_expr, short_expr, exit_expr, fingerprint, checkpoints), n_trials=n_trials)
+            best_trial = study.best_trial
+
+    best_params, best_config = _trial_params(best_trial, base_configs)
+    frame = overlay_indicators(df, base_configs, best_params, fingerprint)
+    long_signal = compile_expr(long_expr)(frame)
+    short_signal = compile_expr(short_expr)(frame)
+    exit_signal = compile_expr(exit_expr)(frame)
+
+    result = backtest(frame, long_signal, short_signal, exit_signal)
+    
+
+    return result, best_config
+
+
+def walk_forward_optimiser(df, base_configs, long_expr, short_expr, exit_expr, train_size, test_size, anchored=False, n_trials=50, n_jobs=1, pruner=None, initial_capital=10000):
+    folds = walk_forward_folds(len(df), train_size, test_size, anchored)
+    if not folds:
+        raise ValueError(f"Not enough bars ({len(df)}) for a {train_size}-bar train window and a {test_size}-bar test window")
+
+    fingerprint = data_fingerprint(df)
+    compile_strategy(df, base_configs, (long_expr, short_expr, exit_expr), fingerprint)
+    args = (base_configs, long_expr, short_expr, exit_expr, n_trials, fingerprint, pruner, initial_capital)
+
+    # Indicators are computed over the full history and sliced per window, so
+    # overlapping windows share both warm-up and cache entries (tulipy
+    # indicators only look backwards, so this adds no look-ahead).
+    with timed("optimiser.walk_forward"):
+        if n_jobs > 1:
+            shm, handle = publish_frame(df)
+            try:
+                with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    fold_results = list(pool.map(_fold_worker, [handle] * len(folds), folds, [args] * len(folds)))
+            finally:
+                shm.close()
+                shm.unlink()
+        else:
+            fold_results = [_run_fold(df, fold, *args) for fold in folds]
+
+    # Each test window starts from initial_capital, so folds are chained by
+    # scaling every curve to the capital the previous fold finished with.
+    pieces = []
+    capital = initial_capital
+    for fold in fold_results:
+        equity = fold.pop("equity")
+        pieces.append(equity * (capital / initial_capital))
+        capital = pieces[-1].iloc[-1]
+
+    stitched = pd.concat(pieces)
+    return {
+        "equity": stitched,
+        "total_return": stitched.iloc[-1] - initial_capital,
+        "folds": pd.DataFrame(fold_results)
+    }
+
+
+def walk_forward_folds(n, train_size, test_size, anchored=False):
+    folds = []
+    train_start = 0
+    train_end = train_size
+    while train_end < n:
+        test_end = min(train_end + test_size, n)
+        folds.append((0 if anchored else train_start, train_end, test_end))
+        train_start += test_size
+        train_end += test_size
+    return folds
+
+
+def _run_fold(df, fold, base_configs, long_expr, short_expr, exit_expr, n_trials, fingerprint, pruner, initial_capital):
+    train_start, train_end, test_end = fold
+    checkpoints = 10 if pruner is not None else None
+
+    study = optuna.create_study(direction="maximize", pruner=make_pruner(pruner))
+    study.optimize(
+        _make_objective(df, base_configs, long_expr, short_expr, exit_expr, fingerprint, checkpoints, window=(train_start, train_end)),
+        n_trials=n_trials
+    )
+    best_params, best_config = _trial_params(study.best_trial, base_configs)
+
+    frame = overlay_indicators(df, base_configs, best_params, fingerprint).slice(train_end, test_end)
+    result = backtest(
+        frame,
+        compile_expr(long_expr)(frame),
+        compile_expr(short_expr)(frame),
+        compile_expr(exit_expr)(frame),
+        initial_capital=initial_capital
+    )
+
+    return {
+        "train_start": df.index[train_start],
+        "train_end": df.index[train_end - 1],
+        "test_start": df.index[train_end],
+        "test_end": df.index[test_end - 1],
+        **study.best_trial.params,
+        "train_return": study.best_value,
+        "test_return": result["total_return"],
+        "test_sharpe": result["sharpe_ratio"],
+        "test_max_drawdown": result["max_drawdown"],
+        "test_trades": result["num_trades"],
+        "equity": result["equity"]
+    }
+
+
+def _fold_worker(handle, fold, args):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    shm, df = attach_frame(handle)
+    try:
+        return _run_fold(df, fold, *args)
+    finally:
+        del df
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+def _trial_params(trial, base_configs):
+    params_by_config = {}
+    config_params = []
+    for i, config in enumerate(base_configs):
+        param_grid = config.get("param_grid", {})
+        if not param_grid:
+            continue
+
+        params_by_config[i] = {
+            key: trial.params[f"{config['name']}_{key}"]
+            for key in param_grid.keys()
+        }
+        config_params.append({
+            "name": config["name"],
+            "params": params_by_config[i]
+        })
+    return params_by_config, config_params
+
+
+def grid_optimiser(df, base_configs, long_expr, short_expr, exit_expr, strides=None, float_steps=5, batch_size=256, stop_loss_pct=0.0, take_profit_pct=0.0):
+    fingerprint = data_fingerprint(df)
+    long_condition, short_condition, exit_condition = compile_strategy(df, base_configs, (long_expr, short_expr, exit_expr), fingerprint)
+    strides = strides or {}
+
+    # Each config's own sub-grid is computed once up front; combinations only
+    # mix the already aligned indicator columns.
+    config_grids = []
+    for i, config in enumerate(base_configs):
+        param_grid = config.get("param_grid", {})
+        if not param_grid:
+            continue
+
+        keys = list(param_grid.keys())
+        values = [
+            grid_values(bounds, strides.get(f"{config['name']}_{key}", 1), float_steps)
+            for key, bounds in param_grid.items()
+        ]
+        entries = []
+        for combo in itertools.product(*values):
+            params = dict(zip(keys, combo))
+            columns = overlay_indicators(df, base_configs, {i: params}, fingerprint).extra
+            entries.append(({f"{config['name']}_{key}": value for key, value in params.items()}, columns))
+        config_grids.append(entries)
+
+    n = len(df)
+    combos = list(itertools.product(*config_grids))
+    results = []
+    for start in range(0, len(combos), batch_size):
+        chunk = combos[start:start + batch_size]
+        longs = np.empty((n, len(chunk)), dtype=bool)
+        shorts = np.empty((n, len(chunk)), dtype=bool)
+        exits = np.empty((n, len(chunk)), dtype=bool)
+        chunk_params = []
+
+        for j, combo in enumerate(chunk):
+            frame = ColumnOverlay(df)
+            params = {}
+            for sampled, columns in combo:
+                frame.extra.update(columns)
+                params.update(sampled)
+            longs[:, j] = long_condition(frame)
+            shorts[:, j] = short_condition(frame)
+            exits[:, j] = exit_condition(frame)
+            chunk_params.append(params)
+
+        with timed("optimiser.grid_batch"):
+            batch = backtest_batch(df, longs, shorts, exits, stop_loss_pct=stop_loss_pct, take_profit_pct=take_profit_pct)
+        count("optimiser.grid_combinations", len(chunk))
+        metrics = batch["metrics"].drop(columns=["stop_loss_pct", "take_profit_pct"]).reset_index(drop=True)
+        results.append(pd.concat([pd.DataFrame(chunk_params), metrics], axis=1))
+
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True).sort_values("total_return", ascending=False, ignore_index=True)
+
+
+def grid_values(bounds, stride=1, float_steps=5):
+    low, high = bounds
+    if isinstance(low, int) and isinstance(high, int):
+        return list(range(low, high + 1, max(int(stride), 1)))
+    return [float(v) for v in np.linspace(low, high, max(int(float_steps), 2))]
+
+
+def overlay_indicators(df, base_configs, params_by_config, fingerprint=None):
+    # Trial columns are also registered under the names the strategy was built
+    # with (the configs' own params), so expressions written against the
+    # original columns pick up the trial's values.
+    frame = ColumnOverlay(df)
+    selected = [config for i, config in enumerate(base_configs) if i in params_by_config]
+    trial_configs = [{
+        "name": config["name"],
+        "inputs": config["inputs"],
+        "params": params_by_config[i]
+    } for i, config in enumerate(base_configs) if i in params_by_config]
+
+    for config, outputs in zip(selected, get_indicators_many(df, trial_configs, fingerprint=fingerprint)):
+        base_names = indicator_column_names(config["name"], config["params"], len(outputs))
+        for (col, series), base_name in zip(outputs.items(), base_names):
+            frame.add(col, series)
+            if base_name != col:
+                frame.alias(base_name, col)
+    return frame
+
+
+def compile_strategy(df, base_configs, exprs, fingerprint=None):
+    # Column references are checked once against the frame a trial will see,
+    # instead of surfacing as a failed trial on every evaluation.
+    default_params = {i: config["params"] for i, config in enumerate(base_configs) if config.get("param_grid")}
+    columns = overlay_indicators(df, base_configs, default_params, fingerprint).columns
+    return [compile_expr(expr).validate(columns) for expr in exprs]
+
+
+def make_pruner(pruner):
+    if pruner is None:
+        return optuna.pruners.NopPruner()
+    if pruner == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+    if pruner == "halving":
+        return optuna.pruners.SuccessiveHalvingPruner()
+    if isinstance(pruner, optuna.pruners.BasePruner):
+        return pruner
+    raise ValueError(f"Unknown pruner '{pruner}', expected 'median', 'halving' or an optuna pruner")
+
+
+def _make_objective(df, base_configs, long_expr, short_expr, exit_expr, fingerprint, checkpoints=None, window=None):
+    long_condition = compile_expr(long_expr)
+    short_condition = compile_expr(short_expr)
+    exit_condition = compile_expr(exit_expr)
 
-def bayesian_optimiser(df, base_configs, long_expr, short_expr, exit_expr, n_trials=50):
     def objective(trial):
-        df_copy = df.copy()
-        applied_configs = []
+        count("optimiser.trials")
+        with timed("optimiser.trial"):
+            return evaluate(trial)
 
-        for config in base_configs:
+    def evaluate(trial):
+        sampled = {}
+        for i, config in enumerate(base_configs):
             param_grid = config.get("param_grid", {})
             if not param_grid:
                 continue
@@ -19,70 +289,99 @@ def bayesian_optimiser(df, base_configs, long_expr, short_expr, exit_expr, n_tri
                     sampled_params[key] = trial.suggest_int(f"{config['name']}_{key}", bounds[0], bounds[1])
                 else:
                     sampled_params[key] = trial.suggest_float(f"{config['name']}_{key}", bounds[0], bounds[1])
+            sampled[i] = sampled_params
 
-            outputs = get_indicators(df_copy, {
-                "name": config["name"],
-                "inputs": config["inputs"],
-                "params": sampled_params
-            })
-
-            for col, series in outputs.items():
-                df_copy[col] = series
-
-            applied_configs.append({
-                "name": config["name"],
-                "params": sampled_params,
-                "inputs": config["inputs"]
-            })
+        frame = overlay_indicators(df, base_configs, sampled, fingerprint)
+        if window is not None:
+            frame = frame.slice(*window)
 
         try:
-            safe_globals = {"df": df_copy, "pd": pd, "len": len, "__builtins__": {}}
-            long_signal = eval(long_expr, safe_globals)
-            short_signal = eval(short_expr, safe_globals)
-            exit_signal = eval(exit_expr, safe_globals)
+            long_signal = long_condition(frame)
+            short_signal = short_condition(frame)
+            exit_signal = exit_condition(frame)
+
+            if checkpoints:
+                def report(step, bar, total_return):
+                    trial.report(total_return, step)
+                    if trial.should_prune():
+                        raise optuna.TrialPruned()
 
-            result = backtest(df_copy, long_signal, short_signal, exit_signal)
+                result = backtest(frame, long_signal, short_signal, exit_signal, checkpoints=checkpoints, on_checkpoint=report, lean=True)
+            else:
+                result = backtest(frame, long_signal, short_signal, exit_signal, lean=True)
             return result["total_return"]
+        except optuna.TrialPruned:
+            count("optimiser.pruned")
+            raise
         except Exception:
             return -float("inf")
 
-    study = optuna.create_study(direction="maximize")
-    study.optimize(objective, n_trials=n_trials)
+    return objective
 
-    best_trial = study.best_trial
-    df_copy = df.copy()
-    best_config = []
 
-    for config in base_configs:
-        param_grid = config.get("param_grid", {})
-        if not param_grid:
-            continue
+def _optimise_parallel(df, base_configs, long_expr, short_expr, exit_expr, n_trials, n_jobs, fingerprint, pruner=None, checkpoints=None):
+    # Workers coordinate through a journal file (safe for concurrent writers on
+    # one machine) and read prices from a shared-memory block, so the frame is
+    # published once instead of being pickled into every process.
+    shm, handle = publish_frame(df)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage_path = os.path.join(tmp_dir, "study.log")
+            study = optuna.create_study(direction="maximize", storage=_journal_storage(storage_path), pruner=make_pruner(pruner))
 
-        sampled_params = {
-            key: best_trial.params[f"{config['name']}_{key}"]
-            for key in param_grid.keys()
-        }
+            shares = [n_trials // n_jobs + (1 if i < n_trials % n_jobs else 0) for i in range(n_jobs)]
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [
+                    pool.submit(_optimise_worker, handle, storage_path, study.study_name, base_configs, long_expr, short_expr, exit_expr, share, fingerprint, pruner, checkpoints)
+                    for share in shares if share > 0
+                ]
+                for future in futures:
+                    future.result()
 
-        outputs = get_indicators(df_copy, {
-            "name": config["name"],
-            "inputs": config["inputs"],
-            "params": sampled_params
-        })
+            return study.best_trial
+    finally:
+        shm.close()
+        shm.unlink()
 
-        for col, series in outputs.items():
-            df_copy[col] = series
 
-        best_config.append({
-            "name": config["name"],
-            "params": sampled_params
-        })
+def _optimise_worker(handle, storage_path, study_name, base_configs, long_expr, short_expr, exit_expr, n_trials, fingerprint, pruner=None, checkpoints=None):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    shm, df = attach_frame(handle)
+    try:
+        study = optuna.load_study(study_name=study_name, storage=_journal_storage(storage_path), pruner=make_pruner(pruner))
+        study.optimize(_make_objective(df, base_configs, long_expr, short_expr, exit_expr, fingerprint, checkpoints), n_trials=n_trials)
+    finally:
+        del df
+        try:
+            shm.close()
+        except BufferError:
+            pass
 
-    safe_globals = {"df": df_copy, "pd": pd, "len": len, "__builtins__": {}}
-    long_signal = eval(long_expr, safe_globals)
-    short_signal = eval(short_expr, safe_globals)
-    exit_signal = eval(exit_expr, safe_globals)
 
-    result = backtest(df_copy, long_signal, short_signal, exit_signal)
-    
+def _journal_storage(path):
+    return JournalStorage(JournalFileBackend(path))
 
-    return result, best_config
+
+def publish_frame(df):
+    numeric = df.select_dtypes(include="number")
+    values = numeric.to_numpy(dtype=np.float64).T
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)[:] = values
+
+    handle = {
+        "name": shm.name,
+        "shape": values.shape,
+        "columns": list(numeric.columns),
+        "index": df.index,
+    }
+    return shm, handle
+
+
+def attach_frame(handle):
+    shm = shared_memory.SharedMemory(name=handle["name"])
+    values = np.ndarray(handle["shape"], dtype=np.float64, buffer=shm.buf)
+    values.flags.writeable = False
+    # Columns are stored row-major, so the transpose gives a frame whose
+    # columns are each contiguous views into the shared block.
+    df = pd.DataFrame(values.T, index=handle["index"], columns=handle["columns"], copy=False)
+    return shm, df
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from backtest_engine import fused_metrics, _signal_matrix
+from profiling import timed
+
+
+def align_prices(frames, column="Close"):
+    # {ticker: OHLCV frame} -> one price matrix on the union of all timestamps,
+    # NaN where a ticker has no bar (not listed yet, holidays, gaps).
+    return pd.concat({ticker: frame[column] for ticker, frame in frames.items()}, axis=1).sort_index()
+
+
+def portfolio_backtest(prices, long_signals, short_signals, exit_signals, initial_capital=10000, position_size=None, max_positions=None, stop_loss_pct=0.0, take_profit_pct=0.0):
+    # Shared-cash portfolio over K assets. prices is an (n, K) frame of closes
+    # (see align_prices); signals are (n, K) boolean matrices in the same
+    # layout. Each bar applies the single-asset rules to every asset at once:
+    # open positions are closed on exit/SL/TP first, then flat assets with a
+    # signal are entered at position_size of current portfolio equity (equal
+    # weight, 0.95 / max_positions, when None). At most max_positions (default
+    # K) are held; when more assets signal than there are free slots, earlier
+    # columns win, and long entries are scaled down together if they would
+    # cost more than the available cash. Assets are only traded on bars where
+    # they have a price; in between they are valued at their last price.
+    if not isinstance(prices, pd.DataFrame):
+        prices = pd.DataFrame(prices)
+    raw = prices.to_numpy(dtype=np.float64)
+    n, k = raw.shape
+    tradable = np.isfinite(raw) & (raw > 0)
+    close = prices.ffill().to_numpy(dtype=np.float64)
+    # Before an asset's first bar there is no price to carry forward. It is
+    # never held or traded there, so a 0 keeps it out of the portfolio value
+    # and the sizing budget instead of turning both into NaN.
+    close = np.where(np.isnan(close), 0.0, close)
+
+    longs = _signal_matrix(long_signals, n)
+    shorts = _signal_matrix(short_signals, n)
+    exits = _signal_matrix(exit_signals, n)
+    if longs.shape[1] != k or shorts.shape[1] != k or exits.shape[1] != k:
+        raise ValueError(f"Signal matrices must have {k} columns, one per asset")
+
+    max_positions = k if max_positions is None else int(max_positions)
+    if max_positions < 1:
+        raise ValueError("max_positions must be at least 1")
+    weight = 0.95 / max_positions if position_size is None else float(position_size)
+
+    stop_loss = np.broadcast_to(np.asarray(stop_loss_pct, dtype=np.float64), (k,))
+    take_profit = np.broadcast_to(np.asarray(take_profit_pct, dtype=np.float64), (k,))
+    use_stop_loss = stop_loss > 0
+    use_take_profit = take_profit > 0
+    stop_loss_level = -stop_loss / 100
+    take_profit_level = take_profit / 100
+
+    cash = float(initial_capital)
+    side = np.zeros(k, dtype=np.int8)
+    shares = np.zeros(k)
+    entry_price = np.zeros(k)
+    entry_bar = np.zeros(k, dtype=np.int64)
+    equity = np.empty(n)
+    cash_curve = np.empty(n)
+    exposure = np.zeros((n, k))
+    closed = []
+
+    with timed("portfolio.simulate"), np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(n):
+            price = close[i]
+            can_trade = tradable[i]
+            was_held = side != 0
+            held = was_held.copy()
+
+            if held.any():
+                change = side * (price - entry_price) / entry_price
+                closing = held & can_trade & (exits[i] | (use_stop_loss & (change <= stop_loss_level)) | (use_take_profit & (change >= take_profit_level)))
+                if closing.any():
+                    assets = np.flatnonzero(closing)
+                    pnl = side[assets] * (price[assets] - entry_price[assets]) * shares[assets]
+                    cash += float(np.dot(side[assets] * shares[assets], price[assets]))
+                    closed.append((assets, entry_bar[assets], np.full(len(assets), i), side[assets].copy(), entry_price[assets], price[assets], shares[assets], pnl))
+                    side[assets] = 0
+                    shares[assets] = 0
+                    entry_price[assets] = 0
+                    held &= ~closing
+
+            # As in backtest(), an asset closed on this bar is not re-entered
+            # until the next one.
+            entering_long = ~was_held & can_trade & longs[i]
+            entering_short = ~was_held & can_trade & ~longs[i] & shorts[i]
+            entering = entering_long | entering_short
+            if entering.any():
+                free_slots = max_positions - int(held.sum())
+                entering &= np.cumsum(entering) <= free_slots
+                if entering.any():
+                    value = cash + float(np.dot(side * shares, price))
+                    budget = np.where(entering, value * weight, 0.0)
+                    long_cost = budget[entering & entering_long].sum()
+                    if long_cost > cash:
+                        scale = max(cash, 0.0) / long_cost
+                        budget = np.where(entering_long, budget * scale, budget)
+                    new_shares = np.trunc(budget / price)
+                    entering &= new_shares > 0
+
+                    assets = np.flatnonzero(entering)
+                    new_side = np.where(entering_long[assets], 1, -1).astype(np.int8)
+                    side[assets] = new_side
+                    shares[assets] = new_shares[assets]
+                    entry_price[assets] = price[assets]
+                    entry_bar[assets] = i
+                    cash -= float(np.dot(new_side * new_shares[assets], price[assets]))
+
+            position_value = side * shares * price
+            exposure[i] = position_value
+            cash_curve[i] = cash
+            equity[i] = cash + position_value.sum()
+
+    tickers = prices.columns
+    index = prices.index
+    with timed("portfolio.metrics"):
+        trades = _trade_frame(closed, tickers, index)
+        pnls = trades["PnL"].to_numpy()
+        metrics, drawdown = fused_metrics(equity[:, None], index, initial_capital, np.array([len(pnls)]), np.array([np.count_nonzero(pnls > 0)]))
+
+    result = {key: values[0] for key, values in metrics.items()}
+    result.update({
+        'equity': pd.Series(equity, index=index),
+        'cash': pd.Series(cash_curve, index=index),
+        'exposure': pd.DataFrame(exposure, index=index, columns=tickers),
+        'gross_exposure': pd.Series(np.abs(exposure).sum(axis=1), index=index),
+        'drawdown': pd.Series(drawdown[:, 0], index=index),
+        'trade_pnls': pnls,
+        'trades': trades
+    })
+    return result
+
+
+def _trade_frame(closed, tickers, index):
+    if not closed:
+        return pd.DataFrame({
+            "Ticker": pd.Series(dtype=object),
+            "Entry Time": index[:0],
+            "Exit Time": index[:0],
+            "Type": pd.Series(dtype=object),
+            "Entry Price": pd.Series(dtype=np.float64),
+            "Exit Price": pd.Series(dtype=np.float64),
+            "Shares": pd.Series(dtype=np.float64),
+            "PnL": pd.Series(dtype=np.float64)
+        })
+    assets, entry_bars, exit_bars, sides, entry_prices, exit_prices, shares, pnls = (np.concatenate(column) for column in zip(*closed))
+    return pd.DataFrame({
+        "Ticker": np.asarray(tickers)[assets],
+        "Entry Time": index[entry_bars],
+        "Exit Time": index[exit_bars],
+        "Type": np.where(sides == 1, "Long", "Short"),
+        "Entry Price": entry_prices,
+        "Exit Price": exit_prices,
+        "Shares": shares,
+        "PnL": pnls
+    })
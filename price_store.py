@@ -0,0 +1,110 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from data_fetcher import CACHE_DIR
+
+
+OHLCV_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+
+class PriceStore:
+    # OHLCV bars kept as one .npy file per column (contiguous float64, plus the
+    # int64 timestamps) under <root>/<interval>/<TICKER>/. Opening
+    # memory-maps the files read-only, so columns are handed to tulipy and the
+    # backtest without a copy, and any number of processes (optimiser workers,
+    # batch runners) mapping the same ticker share one copy in the page cache.
+    def __init__(self, root=os.path.join(CACHE_DIR, "store")):
+        self.root = root
+
+    def path(self, ticker, interval):
+        safe_ticker = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+        return os.path.join(self.root, interval, safe_ticker)
+
+    def exists(self, ticker, interval):
+        return os.path.exists(os.path.join(self.path(ticker, interval), "meta.json"))
+
+    def write(self, ticker, interval, data, covered_from=None, fetched_at=None):
+        # Written to a sibling directory and swapped in, so readers never map a
+        # half-written column. Readers that already have the old files mapped
+        # keep seeing them until they re-open. covered_from and fetched_at are
+        # the source cache's (see OHLCVCache.load), so callers can tell when
+        # the cache has moved on.
+        path = self.path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        columns = [col for col in OHLCV_COLUMNS if col in data.columns]
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(path))
+        try:
+            index = pd.DatetimeIndex(data.index)
+            np.save(os.path.join(tmp_dir, "index.npy"), index.asi8)
+            for col in columns:
+                np.save(os.path.join(tmp_dir, f"{col}.npy"), np.ascontiguousarray(data[col].to_numpy(dtype=np.float64)))
+            meta = {
+                "columns": columns,
+                "rows": len(data),
+                "tz": str(index.tz) if index.tz is not None else None,
+                "unit": index.unit,
+                "index_name": index.name,
+                "last_bar": index[-1].isoformat() if len(index) else None,
+                "covered_from": covered_from.isoformat() if covered_from is not None else None,
+                "fetched_at": fetched_at.isoformat() if fetched_at is not None else None,
+            }
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+
+            old_dir = None
+            if os.path.exists(path):
+                old_dir = tempfile.mkdtemp(prefix=".old-", dir=os.path.dirname(path))
+                os.replace(path, os.path.join(old_dir, "data"))
+            os.replace(tmp_dir, path)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return path
+
+    def metadata(self, ticker, interval):
+        meta_path = os.path.join(self.path(ticker, interval), "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def open(self, ticker, interval):
+        meta = self.metadata(ticker, interval)
+        if meta is None:
+            return None
+        return MappedPrices(self.path(ticker, interval), meta)
+
+    def load(self, ticker, interval):
+        prices = self.open(ticker, interval)
+        return None if prices is None else prices.frame()
+
+
+class MappedPrices:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.columns = {
+            col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r")
+            for col in meta["columns"]
+        }
+        index = pd.DatetimeIndex(np.load(os.path.join(path, "index.npy"), mmap_mode="r").view(f"datetime64[{meta['unit']}]"), name=meta.get("index_name"), copy=False)
+        # Naive timestamps stay mapped; localising a tz-aware index copies it.
+        self.index = index.tz_localize("UTC").tz_convert(meta["tz"]) if meta.get("tz") else index
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def column(self, name):
+        # Read-only, C-contiguous float64 view onto the mapped file.
+        return self.columns[name]
+
+    def frame(self):
+        # A DataFrame whose columns are the mapped arrays themselves. Adding
+        # indicator columns (assign / ColumnOverlay) leaves them shared.
+        return pd.DataFrame({col: pd.Series(values, index=self.index, copy=False) for col, values in self.columns.items()}, copy=False)
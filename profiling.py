@@ -0,0 +1,103 @@
+import io
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import pandas as pd
+
+
+_active_timer = ContextVar("active_timer", default=None)
+
+
+class StageTimer:
+    # Collects wall-clock time and call counts per named stage, plus free-form
+    # counters, for everything that runs while the timer is active. Stages
+    # nest (e.g. "backtest" contains "backtest.simulate"), so totals overlap.
+    # The span from start() to stop() is recorded as the "total" stage.
+    def __init__(self, profile=False):
+        self.timings = {}
+        self.counters = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self._lock = threading.Lock()
+        self._token = None
+        self._started = None
+
+    def start(self):
+        self._token = _active_timer.set(self)
+        self._started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self._started is not None:
+            self.record("total", time.perf_counter() - self._started)
+            self._started = None
+        if self._token is not None:
+            _active_timer.reset(self._token)
+            self._token = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            total, calls = self.timings.get(stage, (0.0, 0))
+            self.timings[stage] = (total + seconds, calls + 1)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_frame(self):
+        rows = [
+            {"stage": stage, "seconds": total, "calls": calls, "mean_ms": total / calls * 1000}
+            for stage, (total, calls) in self.timings.items()
+        ]
+        return pd.DataFrame(rows, columns=["stage", "seconds", "calls", "mean_ms"])
+
+    def profile_stats(self, limit=30, sort="cumulative"):
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def dump_profile(self, path):
+        if self.profiler is None:
+            raise ValueError("Profiling was not enabled for this run")
+        self.profiler.dump_stats(path)
+
+
+def active_timer():
+    return _active_timer.get()
+
+
+@contextmanager
+def timed(stage, timings=None):
+    # Records into the active StageTimer (if any) and, when given, into a plain
+    # dict so callers can hand their own breakdown back with their result.
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timer = _active_timer.get()
+        if timer is not None:
+            timer.record(stage, elapsed)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def count(name, n=1):
+    timer = _active_timer.get()
+    if timer is not None:
+        timer.count(name, n)
@@ -0,0 +1,133 @@
+import ast
+from functools import lru_cache
+import numpy as np
+
+
+NO_SIGNAL_EXPR = "pd.Series([False] * len(df), index=df.index)"
+
+COMPARISONS = {
+    ast.Gt: np.greater,
+    ast.Lt: np.less,
+    ast.GtE: np.greater_equal,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+LOGICAL_OPS = {
+    ast.BitAnd: np.logical_and,
+    ast.BitOr: np.logical_or,
+    ast.BitXor: np.logical_xor,
+}
+
+ARITHMETIC_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+}
+
+
+class CompiledCondition:
+    def __init__(self, expr, evaluator, columns):
+        self.expr = expr
+        self.evaluator = evaluator
+        self.columns = columns
+
+    def validate(self, available_columns):
+        available = set(available_columns)
+        missing = [col for col in self.columns if col not in available]
+        if missing:
+            raise ValueError(f"Unknown column(s) in strategy expression: {', '.join(missing)}")
+        return self
+
+    def __call__(self, frame):
+        n = len(frame)
+        arrays = {col: np.asarray(frame[col]) for col in self.columns}
+        with np.errstate(all="ignore"):
+            result = self.evaluator(arrays)
+        return np.broadcast_to(np.asarray(result, dtype=bool), (n,))
+
+
+def conditions_to_expr(conditions, columns):
+    expressions = []
+    for cond in conditions:
+        right_expr = f"df['{cond['right']}']" if cond['right'] in columns else cond['right']
+        expressions.append(f"(df['{cond['left']}'] {cond['op']} {right_expr})")
+
+    if expressions:
+        return " & ".join(expressions)
+    else:
+        return NO_SIGNAL_EXPR
+
+
+def compile_conditions(conditions, columns):
+    return compile_expr(conditions_to_expr(conditions, columns)).validate(columns)
+
+
+@lru_cache(maxsize=1024)
+def compile_expr(expr):
+    try:
+        tree = ast.parse(expr.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid strategy expression '{expr}': {e.msg}")
+
+    if ast.dump(tree) == _NO_SIGNAL_DUMP:
+        return CompiledCondition(expr, lambda arrays: False, ())
+
+    columns = []
+    evaluator = _compile_node(tree.body, columns, expr)
+    return CompiledCondition(expr, evaluator, tuple(dict.fromkeys(columns)))
+
+
+def _compile_node(node, columns, expr):
+    if isinstance(node, ast.Subscript):
+        col = _column_name(node)
+        if col is None:
+            raise ValueError(f"Only df['column'] lookups are allowed in strategy expressions: '{expr}'")
+        columns.append(col)
+        return lambda arrays: arrays[col]
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool)):
+        value = node.value
+        return lambda arrays: value
+
+    if isinstance(node, ast.Compare):
+        if len(node.ops) != 1 or type(node.ops[0]) not in COMPARISONS:
+            raise ValueError(f"Unsupported comparison in strategy expression: '{expr}'")
+        return _binary(COMPARISONS[type(node.ops[0])], node.left, node.comparators[0], columns, expr)
+
+    if isinstance(node, ast.BinOp):
+        op = LOGICAL_OPS.get(type(node.op)) or ARITHMETIC_OPS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operator in strategy expression: '{expr}'")
+        return _binary(op, node.left, node.right, columns, expr)
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand, columns, expr)
+        if isinstance(node.op, ast.Invert):
+            return lambda arrays: np.logical_not(operand(arrays))
+        if isinstance(node.op, ast.USub):
+            return lambda arrays: np.negative(operand(arrays))
+        if isinstance(node.op, ast.UAdd):
+            return operand
+
+    raise ValueError(f"Unsupported syntax in strategy expression: '{expr}'")
+
+
+def _binary(op, left_node, right_node, columns, expr):
+    left = _compile_node(left_node, columns, expr)
+    right = _compile_node(right_node, columns, expr)
+    return lambda arrays: op(left(arrays), right(arrays))
+
+
+def _column_name(node):
+    if not (isinstance(node.value, ast.Name) and node.value.id == "df"):
+        return None
+    key = node.slice
+    if isinstance(key, ast.Constant) and isinstance(key.value, str):
+        return key.value
+    return None
+
+
+_NO_SIGNAL_DUMP = ast.dump(ast.parse(NO_SIGNAL_EXPR, mode="eval"))
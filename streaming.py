@@ -0,0 +1,485 @@
+import math
+from collections import deque
+import numpy as np
+from indicator_engine import indicator_column_names
+from strategy_compiler import compile_expr
+
+
+# Per-bar versions of the tulipy indicators. Each kernel follows tulipy's own
+# recurrences (seeds, running sums, update order), so replaying a history
+# through step() reproduces compute_indicators() to floating point precision.
+# step() returns None until the indicator's warm-up is over, matching the
+# leading NaNs in the batch output.
+
+class _Kernel:
+    deques = ()
+
+    def state(self):
+        return {key: list(value) if key in self.deques else value for key, value in vars(self).items()}
+
+    def restore(self, state):
+        for key, value in state.items():
+            setattr(self, key, deque(value, maxlen=getattr(self, key).maxlen) if key in self.deques else value)
+        return self
+
+
+class SMA(_Kernel):
+    deques = ("window",)
+
+    def __init__(self, period):
+        self.period = int(period)
+        self.scale = 1.0 / self.period
+        self.window = deque(maxlen=self.period)
+        self.total = 0.0
+
+    def step(self, value):
+        if len(self.window) == self.period:
+            self.total += value
+            self.total -= self.window[0]
+        else:
+            self.total += value
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return None
+        return (self.total * self.scale,)
+
+
+class EMA(_Kernel):
+    def __init__(self, period):
+        self.per = 2 / (float(period) + 1)
+        self.value = None
+
+    def step(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value = (value - self.value) * self.per + self.value
+        return (self.value,)
+
+
+class Wilders(_Kernel):
+    def __init__(self, period):
+        self.period = int(period)
+        self.per = 1.0 / self.period
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def step(self, value):
+        if self.value is not None:
+            self.value = (value - self.value) * self.per + self.value
+            return (self.value,)
+        self.total += value
+        self.count += 1
+        if self.count < self.period:
+            return None
+        self.value = self.total / self.period
+        return (self.value,)
+
+
+class RSI(_Kernel):
+    def __init__(self, period):
+        self.period = int(period)
+        self.per = 1.0 / self.period
+        self.previous = None
+        self.count = 0
+        self.up = 0.0
+        self.down = 0.0
+
+    def step(self, value):
+        previous, self.previous = self.previous, value
+        if previous is None:
+            return None
+        upward = value - previous if value > previous else 0.0
+        downward = previous - value if value < previous else 0.0
+        if self.count < self.period:
+            self.up += upward
+            self.down += downward
+            self.count += 1
+            if self.count < self.period:
+                return None
+            self.up /= self.period
+            self.down /= self.period
+        else:
+            self.up = (upward - self.up) * self.per + self.up
+            self.down = (downward - self.down) * self.per + self.down
+        return (100.0 * (self.up / (self.up + self.down)),)
+
+
+def _true_range(high, low, previous_close):
+    if previous_close is None:
+        return high - low
+    result = high - low
+    above = abs(high - previous_close)
+    below = abs(low - previous_close)
+    if above > result:
+        result = above
+    if below > result:
+        result = below
+    return result
+
+
+class ATR(_Kernel):
+    def __init__(self, period):
+        self.smoother = Wilders(period)
+        self.previous_close = None
+
+    def step(self, high, low, close):
+        true_range = _true_range(high, low, self.previous_close)
+        self.previous_close = close
+        return self.smoother.step(true_range)
+
+    def state(self):
+        return {"smoother": self.smoother.state(), "previous_close": self.previous_close}
+
+    def restore(self, state):
+        self.smoother.restore(state["smoother"])
+        self.previous_close = state["previous_close"]
+        return self
+
+
+class NATR(ATR):
+    def step(self, high, low, close):
+        out = super().step(high, low, close)
+        return None if out is None else (100 * out[0] / close,)
+
+
+class TR(_Kernel):
+    def __init__(self):
+        self.previous_close = None
+
+    def step(self, high, low, close):
+        true_range = _true_range(high, low, self.previous_close)
+        self.previous_close = close
+        return (true_range,)
+
+
+class MACD(_Kernel):
+    def __init__(self, short_period, long_period, signal_period):
+        self.short_per = 2 / (float(short_period) + 1)
+        self.long_per = 2 / (float(long_period) + 1)
+        self.signal_per = 2 / (float(signal_period) + 1)
+        if short_period == 12 and long_period == 26:
+            # tulipy hard-codes these smoothing factors for the classic setting.
+            self.short_per = 0.15
+            self.long_per = 0.075
+        self.long_period = int(long_period)
+        self.count = 0
+        self.short_ema = None
+        self.long_ema = None
+        self.signal_ema = 0.0
+
+    def step(self, value):
+        self.count += 1
+        if self.short_ema is None:
+            self.short_ema = self.long_ema = value
+        else:
+            self.short_ema = (value - self.short_ema) * self.short_per + self.short_ema
+            self.long_ema = (value - self.long_ema) * self.long_per + self.long_ema
+        if self.count < self.long_period or self.count == 1:
+            return None
+        out = self.short_ema - self.long_ema
+        if self.count == self.long_period:
+            self.signal_ema = out
+        self.signal_ema = (out - self.signal_ema) * self.signal_per + self.signal_ema
+        return (out, self.signal_ema, out - self.signal_ema)
+
+
+class BBands(_Kernel):
+    deques = ("window",)
+
+    def __init__(self, period, stddev):
+        self.period = int(period)
+        self.stddev = float(stddev)
+        self.scale = 1.0 / self.period
+        self.window = deque(maxlen=self.period)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def step(self, value):
+        full = len(self.window) == self.period
+        self.total += value
+        self.total_sq += value * value
+        if full:
+            old = self.window[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return None
+        middle = self.total * self.scale
+        sd = math.sqrt(self.total_sq * self.scale - middle * middle)
+        return (middle - self.stddev * sd, middle, middle + self.stddev * sd)
+
+
+class _Lagged(_Kernel):
+    deques = ("window",)
+
+    def __init__(self, period):
+        self.window = deque(maxlen=int(period) + 1)
+
+    def step(self, value):
+        self.window.append(value)
+        if len(self.window) < self.window.maxlen:
+            return None
+        return (self.compute(value, self.window[0]),)
+
+
+class MOM(_Lagged):
+    def compute(self, value, old):
+        return value - old
+
+
+class ROC(_Lagged):
+    def compute(self, value, old):
+        return (value - old) / old
+
+
+class ROCR(_Lagged):
+    def compute(self, value, old):
+        return value / old
+
+
+class VWMA(_Kernel):
+    deques = ("window",)
+
+    def __init__(self, period):
+        self.period = int(period)
+        self.window = deque(maxlen=self.period)
+        self.total = 0.0
+        self.volume = 0.0
+
+    def step(self, close, volume):
+        if len(self.window) == self.period:
+            old_close, old_volume = self.window[0]
+            self.total += close * volume
+            self.total -= old_close * old_volume
+            self.volume += volume
+            self.volume -= old_volume
+        else:
+            self.total += close * volume
+            self.volume += volume
+        self.window.append((close, volume))
+        if len(self.window) < self.period:
+            return None
+        return (self.total / self.volume,)
+
+    def restore(self, state):
+        super().restore(state)
+        self.window = deque((tuple(item) for item in self.window), maxlen=self.period)
+        return self
+
+
+class OBV(_Kernel):
+    def __init__(self):
+        self.previous = None
+        self.total = 0.0
+
+    def step(self, close, volume):
+        if self.previous is not None:
+            if close > self.previous:
+                self.total += volume
+            elif close < self.previous:
+                self.total -= volume
+        self.previous = close
+        return (self.total,)
+
+
+class _Price(_Kernel):
+    def __init__(self, combine):
+        self.combine = combine
+
+    def state(self):
+        return {}
+
+    def restore(self, state):
+        return self
+
+    def step(self, *values):
+        return (self.combine(*values),)
+
+
+KERNELS = {
+    "sma": SMA,
+    "ema": EMA,
+    "wilders": Wilders,
+    "rsi": RSI,
+    "atr": ATR,
+    "natr": NATR,
+    "tr": TR,
+    "macd": MACD,
+    "bbands": BBands,
+    "mom": MOM,
+    "roc": ROC,
+    "rocr": ROCR,
+    "vwma": VWMA,
+    "obv": OBV,
+    "avgprice": lambda: _Price(lambda o, h, l, c: (o + h + l + c) * 0.25),
+    "medprice": lambda: _Price(lambda h, l: (h + l) * 0.5),
+    "typprice": lambda: _Price(lambda h, l, c: (h + l + c) * (1.0 / 3.0)),
+    "wcprice": lambda: _Price(lambda h, l, c: (h + l + c + c) * 0.25),
+}
+
+
+class StreamingIndicator:
+    # Wraps a kernel for one config from indicators_list (or the app's
+    # selected_indicators) and names its outputs like compute_indicators().
+    def __init__(self, config):
+        name = config["name"].lower()
+        if name not in KERNELS:
+            raise ValueError(f"Indicator '{name}' has no streaming implementation (supported: {', '.join(sorted(KERNELS))})")
+        self.config = config
+        self.inputs = list(config["inputs"])
+        self.kernel = KERNELS[name](*config["params"].values())
+        n_outputs = 3 if name in ("macd", "bbands") else 1
+        self.columns = indicator_column_names(name, config["params"], n_outputs)
+
+    def update(self, bar):
+        out = self.kernel.step(*(float(bar[col]) for col in self.inputs))
+        if out is None:
+            return dict.fromkeys(self.columns, math.nan)
+        return dict(zip(self.columns, out))
+
+    def run(self, frame):
+        # Steps through a whole block of bars (e.g. one chunk of a file that
+        # does not fit in memory), carrying the state on to the next block.
+        step = self.kernel.step
+        rows = [step(*values) for values in zip(*(frame[col].to_numpy(dtype=np.float64).tolist() for col in self.inputs))]
+        # Kernels only return None during warm-up, so that is a prefix.
+        warm = next((i for i, row in enumerate(rows) if row is not None), len(rows))
+        outputs = np.full((len(self.columns), len(rows)), np.nan)
+        if warm < len(rows):
+            outputs[:, warm:] = np.array(rows[warm:]).T
+        return dict(zip(self.columns, outputs))
+
+
+class BacktestState:
+    # The single-asset state machine of backtest() advanced one bar at a time.
+    # checkpoint() returns plain values that from_checkpoint() resumes from.
+    FIELDS = ("initial_capital", "position_size", "stop_loss_pct", "take_profit_pct",
+              "capital", "position", "shares", "entry_price", "entry_bar", "entry_time", "bar")
+
+    def __init__(self, initial_capital=10000, position_size=0.95, stop_loss_pct=0.0, take_profit_pct=0.0):
+        self.initial_capital = initial_capital
+        self.position_size = position_size
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.capital = initial_capital
+        self.position = 0
+        self.shares = 0
+        self.entry_price = 0
+        self.entry_bar = 0
+        self.entry_time = None
+        self.bar = 0
+
+    def update(self, close, long_signal, short_signal, exit_signal, timestamp=None):
+        # Returns (equity, closed_trade_or_None) for this bar.
+        i = self.bar
+        self.bar += 1
+        trade = None
+
+        if self.position == 0:
+            if long_signal:
+                shares = int((self.capital * self.position_size) / close)
+                if shares > 0:
+                    self._enter(1, shares, close, i, timestamp)
+                    self.capital -= shares * close
+            elif short_signal:
+                shares = int((self.capital * self.position_size) / close)
+                if shares > 0:
+                    self._enter(-1, shares, close, i, timestamp)
+                    self.capital += shares * close
+        else:
+            entry_price = self.entry_price
+            price_change = (close - entry_price) / entry_price if self.position == 1 else (entry_price - close) / entry_price
+            hit_stop_loss = self.stop_loss_pct > 0 and price_change <= -self.stop_loss_pct / 100
+            hit_take_profit = self.take_profit_pct > 0 and price_change >= self.take_profit_pct / 100
+
+            if exit_signal or hit_stop_loss or hit_take_profit:
+                if self.position == 1:
+                    self.capital += self.shares * close
+                    pnl = (close - entry_price) * self.shares
+                else:
+                    self.capital -= self.shares * close
+                    pnl = (entry_price - close) * self.shares
+                trade = {
+                    "Entry Time": self.entry_time,
+                    "Exit Time": timestamp,
+                    "Type": "Long" if self.position == 1 else "Short",
+                    "Entry Price": entry_price,
+                    "Exit Price": close,
+                    "Shares": self.shares,
+                    "PnL": pnl
+                }
+                self.position = 0
+                self.shares = 0
+                self.entry_price = 0
+
+        if self.position == 1:
+            return self.capital + self.shares * close, trade
+        if self.position == -1:
+            return self.capital - self.shares * close, trade
+        return self.capital, trade
+
+    def _enter(self, position, shares, price, bar, timestamp):
+        self.position = position
+        self.shares = shares
+        self.entry_price = price
+        self.entry_bar = bar
+        self.entry_time = timestamp
+
+    def checkpoint(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        state = cls()
+        for field in cls.FIELDS:
+            setattr(state, field, checkpoint[field])
+        return state
+
+
+class StreamingStrategy:
+    # Indicators, strategy expressions and the backtest state for live bars:
+    # update(bar) takes one OHLCV mapping and costs the same however long the
+    # history is. Replaying a frame bar by bar gives the same indicator values,
+    # signals, equity and trades as get_indicators() + backtest().
+    def __init__(self, configs, long_expr, short_expr, exit_expr, initial_capital=10000, position_size=0.95, stop_loss_pct=0.0, take_profit_pct=0.0):
+        self.configs = configs
+        self.exprs = (long_expr, short_expr, exit_expr)
+        self.indicators = [StreamingIndicator(config) for config in configs]
+        columns = ["Open", "High", "Low", "Close", "Volume"] + [col for indicator in self.indicators for col in indicator.columns]
+        self.conditions = [compile_expr(expr).validate(columns).evaluator for expr in self.exprs]
+        self.state = BacktestState(initial_capital, position_size, stop_loss_pct, take_profit_pct)
+        self.trades = []
+
+    def update(self, bar, timestamp=None):
+        row = dict(bar)
+        for indicator in self.indicators:
+            row.update(indicator.update(bar))
+
+        # Warm-up NaNs compare False, exactly as the batch signals do.
+        with np.errstate(invalid="ignore"):
+            signals = [bool(condition(row)) for condition in self.conditions]
+        equity, trade = self.state.update(float(bar["Close"]), *signals, timestamp=timestamp)
+        if trade is not None:
+            self.trades.append(trade)
+        row["long_signal"], row["short_signal"], row["exit_signal"] = signals
+        row["equity"] = equity
+        return row
+
+    def checkpoint(self):
+        return {
+            "backtest": self.state.checkpoint(),
+            "indicators": [indicator.kernel.state() for indicator in self.indicators],
+            "trades": list(self.trades),
+        }
+
+    @classmethod
+    def from_checkpoint(cls, configs, long_expr, short_expr, exit_expr, checkpoint):
+        strategy = cls(configs, long_expr, short_expr, exit_expr)
+        strategy.state = BacktestState.from_checkpoint(checkpoint["backtest"])
+        for indicator, state in zip(strategy.indicators, checkpoint["indicators"]):
+            indicator.kernel.restore(state)
+        strategy.trades = list(checkpoint["trades"])
+        return strategy
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import generate_ohlcv, random_signals
+from backtest_engine import backtest, backtest_batch
+
+
+METRICS = ("total_return", "CAGR", "sharpe_ratio", "num_trades", "win_percentage", "max_drawdown", "sortino", "calmar")
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("stop_loss_pct, take_profit_pct", [(0.0, 0.0), (0.2, 0.0), (0.0, 0.3), (0.15, 0.25)])
+def test_engines_match_loop(seed, stop_loss_pct, take_profit_pct):
+    data = generate_ohlcv(3_000, seed=seed, freq="1h")
+    signals = random_signals(data.index, seed=seed, probability=0.05)
+    results = {engine: backtest(data, *signals, stop_loss_pct=stop_loss_pct, take_profit_pct=take_profit_pct, engine=engine) for engine in ("loop", "array", "sparse")}
+
+    expected = results["loop"]
+    assert len(expected["trades"]) > 0
+    for engine in ("array", "sparse"):
+        result = results[engine]
+        pd.testing.assert_series_equal(result["equity"], expected["equity"])
+        pd.testing.assert_series_equal(result["drawdown"], expected["drawdown"])
+        pd.testing.assert_frame_equal(result["trades"].to_frame(), expected["trades"].to_frame())
+        np.testing.assert_array_equal(result["trade_pnls"], expected["trade_pnls"])
+        for key in METRICS:
+            assert result[key] == expected[key] or (np.isnan(result[key]) and np.isnan(expected[key])), (engine, key)
+
+
+def test_engines_match_without_trades():
+    data = generate_ohlcv(500, freq="1h")
+    flat = pd.Series(False, index=data.index)
+    results = [backtest(data, flat, flat, flat, engine=engine) for engine in ("loop", "array", "sparse")]
+    for result in results[1:]:
+        pd.testing.assert_series_equal(result["equity"], results[0]["equity"])
+        assert result["num_trades"] == 0 and result["trades"].empty
+
+
+# Dense signals, and a capital that leaves entries unaffordable after losses.
+@pytest.mark.parametrize("probability, initial_capital", [(0.05, 10000), (0.4, 10000), (0.05, 150)])
+def test_batch_matches_backtest_per_column(probability, initial_capital):
+    data = generate_ohlcv(3_000, seed=3, freq="1h")
+    rng = np.random.default_rng(3)
+    k = 6
+    matrices = [rng.random((len(data), k)) < probability for _ in range(3)]
+    stop_loss = np.array([0.0, 0.2, 0.0, 0.15, 0.3, 0.0])
+    take_profit = np.array([0.0, 0.0, 0.3, 0.25, 0.0, 0.5])
+    result = backtest_batch(data, *matrices, initial_capital=initial_capital, stop_loss_pct=stop_loss, take_profit_pct=take_profit)
+
+    for j in range(k):
+        signals = [pd.Series(values[:, j], index=data.index) for values in matrices]
+        expected = backtest(data, *signals, initial_capital=initial_capital, stop_loss_pct=stop_loss[j], take_profit_pct=take_profit[j])
+        np.testing.assert_array_equal(result["equity"][j].to_numpy(), expected["equity"].to_numpy())
+        for key in METRICS:
+            assert result["metrics"].loc[j, key] == expected[key] or (np.isnan(result["metrics"].loc[j, key]) and np.isnan(expected[key])), (j, key)
+
+
+def test_lean_result_matches_full():
+    data = generate_ohlcv(2_000, seed=4, freq="1h")
+    signals = random_signals(data.index, seed=4, probability=0.05)
+    full = backtest(data, *signals, stop_loss_pct=0.2)
+    lean = backtest(data, *signals, stop_loss_pct=0.2, lean=True)
+    assert lean["total_return"] == full["total_return"]
+    assert lean["num_trades"] == full["num_trades"]
+    np.testing.assert_array_equal(lean["equity"], full["equity"].to_numpy())
+    assert "sharpe_ratio" not in lean
@@ -0,0 +1,60 @@
+import os
+import pandas as pd
+from batch_runner import load_prices
+from data_fetcher import DataFrameProvider, OHLCVCache
+from price_store import PriceStore
+
+
+def daily_bars(last_bar, close=1.0):
+    index = pd.date_range(end=last_bar, periods=20, freq="1D", tz="UTC")
+    return pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": close, "Volume": 1.0}, index=index)
+
+
+def test_store_follows_the_cache_offline(tmp_path):
+    now = pd.Timestamp.now(tz="UTC")
+    bars = daily_bars(now.normalize() - pd.Timedelta(days=1))
+    cache = OHLCVCache(str(tmp_path / "cache"))
+    store = PriceStore(str(tmp_path / "store"))
+    cache.store("X", "1d", bars.iloc[:-5], bars.index[0], fetched_at=now - pd.Timedelta(hours=2))
+
+    args = ("X", "max", "1d", cache.root, True, store.root)
+    assert len(load_prices(*args)) == 15
+
+    # Topped up by another process (e.g. the app) since the store was filled.
+    cache.store("X", "1d", bars, bars.index[0], fetched_at=now)
+    assert len(load_prices(*args)) == 20
+    assert pd.Timestamp(store.metadata("X", "1d")["fetched_at"]) == now
+
+    # Nothing newer in the cache: the entry is left alone.
+    inode = os.stat(store.path("X", "1d")).st_ino
+    assert len(load_prices(*args)) == 20
+    assert os.stat(store.path("X", "1d")).st_ino == inode
+
+
+def test_store_refreshes_an_open_last_bar(tmp_path, monkeypatch):
+    today = pd.Timestamp.now(tz="UTC").normalize()
+    provider = DataFrameProvider({("X", "1d"): daily_bars(today, close=1.0)})
+    monkeypatch.setattr("data_fetcher.default_provider", provider)
+    args = ("X", "max", "1d", str(tmp_path / "cache"), False, str(tmp_path / "store"))
+    assert load_prices(*args)["Close"].iloc[-1] == 1.0
+
+    # Today's bar was still forming when it was stored.
+    provider.frames[("X", "1d")] = daily_bars(today, close=2.0)
+    assert load_prices(*args)["Close"].iloc[-1] == 2.0
+
+
+def test_store_refill_tops_up_the_requested_period(tmp_path, monkeypatch):
+    # The provider has years of history; refilling the store must fetch the
+    # spec's period and then only the bars since, never the whole history.
+    today = pd.Timestamp.now(tz="UTC").normalize()
+    history = pd.date_range(end=today, periods=2_000, freq="1D", tz="UTC")
+    provider = DataFrameProvider({("X", "1d"): pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 1.0}, index=history)})
+    monkeypatch.setattr("data_fetcher.default_provider", provider)
+    args = ("X", "60d", "1d", str(tmp_path / "cache"), False, str(tmp_path / "store"))
+
+    first = load_prices(*args)
+    second = load_prices(*args)
+    assert [call["period"] for call in provider.calls] == ["60d", None]
+    assert provider.calls[1]["start"] is not None
+    assert first.index[0] >= today - pd.Timedelta(days=60)
+    pd.testing.assert_index_equal(second.index, first.index)
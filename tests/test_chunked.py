@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import generate_ohlcv
+from backtest_engine import backtest
+from chunked import chunked_backtest, write_bar_file
+from indicator_engine import compute_indicators
+from strategy_compiler import compile_expr
+
+
+CONFIGS = [{"name": "sma", "inputs": ["Close"], "params": {"period": 20}}]
+LONG_EXPR = "(df['Close'] > df['SMA_20'])"
+SHORT_EXPR = "(df['Close'] < df['SMA_20'])"
+EXIT_EXPR = "(df['Close'] < df['Open'] * 0.996)"
+CHUNK_SIZE = 97
+METRICS = ("total_return", "CAGR", "num_trades", "win_percentage", "max_drawdown", "calmar")
+
+
+@pytest.mark.parametrize("tz", [None, "America/New_York"])
+def test_chunked_matches_in_memory(tmp_path, tz):
+    data = generate_ohlcv(3_000, seed=6, freq="1h")
+    if tz is not None:
+        data = data.tz_localize("UTC").tz_convert(tz)
+    frame = data.assign(**compute_indicators(data, CONFIGS[0]))
+    signals = [compile_expr(expr).validate(frame.columns)(frame) for expr in (LONG_EXPR, SHORT_EXPR, EXIT_EXPR)]
+    expected = backtest(frame, *signals, stop_loss_pct=0.4, take_profit_pct=0.6)
+
+    path = str(tmp_path / "bars.parquet")
+    write_bar_file(data, path, row_group_size=CHUNK_SIZE)
+    result = chunked_backtest(path, CONFIGS, LONG_EXPR, SHORT_EXPR, EXIT_EXPR, str(tmp_path / "out"), chunk_size=CHUNK_SIZE, stop_loss_pct=0.4, take_profit_pct=0.6)
+
+    # The run must hold positions across chunk boundaries, including ones a
+    # stop-loss or take-profit closes in a later chunk than the entry.
+    trades = expected["trades"]
+    entry_bars, exit_bars = trades.column("entry_bar"), trades.column("exit_bar")
+    spans = entry_bars // CHUNK_SIZE != exit_bars // CHUNK_SIZE
+    stopped = ~np.asarray(signals[2])[exit_bars]
+    assert spans.any() and (spans & stopped).any()
+
+    equity = pd.read_parquet(result["equity_path"])
+    pd.testing.assert_index_equal(pd.DatetimeIndex(equity["timestamp"]), data.index.as_unit("us"), check_names=False)
+    np.testing.assert_array_equal(equity["equity"].to_numpy(), expected["equity"].to_numpy())
+
+    expected_trades = trades.to_frame()
+    expected_trades["Entry Time"] = expected_trades["Entry Time"].dt.as_unit("us")
+    expected_trades["Exit Time"] = expected_trades["Exit Time"].dt.as_unit("us")
+    pd.testing.assert_frame_equal(pd.read_parquet(result["trades_path"]), expected_trades, check_dtype=False)
+
+    assert result["bars"] == len(data)
+    for key in METRICS:
+        assert result[key] == expected[key], key
+    # Sharpe and Sortino are merged from per-chunk return moments, so they
+    # agree with the whole-array sums to rounding only.
+    for key in ("sharpe_ratio", "sortino"):
+        assert result[key] == pytest.approx(expected[key], rel=1e-12, abs=0), key
@@ -0,0 +1,38 @@
+import pandas as pd
+from data_fetcher import fetch_data, DataFrameProvider, OHLCVCache
+
+
+def daily_bars(last_bar):
+    index = pd.date_range(end=last_bar, periods=20, freq="1D", tz="UTC")
+    return pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 1.0}, index=index)
+
+
+def test_open_last_bar_is_refetched(tmp_path):
+    # Today's daily bar is still forming, so a second call must not serve
+    # the snapshot taken by the first.
+    provider = DataFrameProvider({("X", "1d"): daily_bars(pd.Timestamp.now(tz="UTC").normalize())})
+    cache = OHLCVCache(str(tmp_path))
+    fetch_data("X", "60d", "1d", provider=provider, cache=cache)
+    fetch_data("X", "60d", "1d", provider=provider, cache=cache)
+    assert len(provider.calls) == 2
+    assert provider.calls[1]["start"] is not None
+
+
+def test_closed_last_bar_is_served_from_cache(tmp_path):
+    provider = DataFrameProvider({("X", "1d"): daily_bars(pd.Timestamp.now(tz="UTC").normalize() - pd.Timedelta(days=2))})
+    cache = OHLCVCache(str(tmp_path))
+    first = fetch_data("X", "60d", "1d", provider=provider, cache=cache)
+    second = fetch_data("X", "60d", "1d", provider=provider, cache=cache)
+    assert len(provider.calls) == 1
+    pd.testing.assert_frame_equal(first, second, check_freq=False)
+
+
+def test_cache_without_fetch_time_is_refreshed(tmp_path):
+    provider = DataFrameProvider({("X", "1d"): daily_bars(pd.Timestamp.now(tz="UTC").normalize() - pd.Timedelta(days=2))})
+    cache = OHLCVCache(str(tmp_path))
+    fetch_data("X", "60d", "1d", provider=provider, cache=cache)
+    data, meta = cache.load("X", "1d")
+    cache.store("X", "1d", data, meta["covered_from"])
+    fetch_data("X", "60d", "1d", provider=provider, cache=cache)
+    assert len(provider.calls) == 2
+    assert cache.load("X", "1d")[1]["fetched_at"] is not None
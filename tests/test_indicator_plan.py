@@ -0,0 +1,121 @@
+import numpy as np
+import warnings
+import pytest
+import tulipy as tp
+from benchmarks.synthetic import generate_ohlcv
+from indicator_engine import IndicatorCache, compute_indicators, get_indicators, get_indicators_many
+from indicator_plan import IndicatorPlan
+
+
+def config(name, inputs=("Close",), **params):
+    return {"name": name, "inputs": list(inputs), "params": params}
+
+
+HLC = ("High", "Low", "Close")
+EXACT = [
+    config("ema", period=20),
+    config("apo", short_period=10, long_period=20),
+    config("ppo", short_period=10, long_period=30),
+    config("macd", short_period=10, long_period=20, signal_period=7),
+    config("macd", short_period=12, long_period=26, signal_period=9),
+    config("atr", HLC, period=14),
+    config("natr", HLC, period=14),
+    config("dm", ("High", "Low"), period=14),
+    config("rsi", period=14),
+    config("sma", period=20),
+    config("bbands", period=20, stddev=2),
+    config("stoch", HLC, pct_k_period=14, pct_k_slowing_period=3, pct_d_period=3),
+]
+# tulipy rearranges these recurrences, so the planned columns differ in the
+# last bits.
+CLOSE = [
+    config("dema", period=20),
+    config("tema", period=20),
+    config("di", HLC, period=14),
+    config("di", HLC, period=5),
+    config("dx", HLC, period=14),
+    config("adx", HLC, period=14),
+    config("adxr", HLC, period=14),
+]
+
+
+@pytest.fixture(scope="module")
+def data():
+    return generate_ohlcv(5_000, seed=11, freq="1h")
+
+
+def assert_columns_match(planned, expected, rtol):
+    assert list(planned) == list(expected)
+    for col, series in expected.items():
+        assert planned[col].index.equals(series.index)
+        np.testing.assert_allclose(planned[col].to_numpy(), series.to_numpy(), rtol=rtol, atol=0)
+
+
+def test_plan_matches_compute_indicators(data):
+    configs = EXACT + CLOSE
+    for planned, cfg in zip(IndicatorPlan(configs).compute_each(data), configs):
+        rtol = 1e-12 if cfg in CLOSE else 0
+        assert_columns_match(planned, compute_indicators(data, cfg), rtol)
+
+
+@pytest.mark.parametrize("cfg", [
+    config("apo", short_period=20, long_period=10),
+    config("ppo", short_period=20, long_period=10),
+    config("macd", short_period=30, long_period=10, signal_period=9),
+    config("macd", short_period=10, long_period=20, signal_period=0),
+    config("ema", period=0),
+    config("adx", HLC, period=1),
+    config("adxr", HLC, period=1),
+    config("dema", period=40),
+], ids=lambda cfg: f"{cfg['name']}{list(cfg['params'].values())}")
+def test_invalid_options_raise_like_tulipy(cfg):
+    data = generate_ohlcv(60, seed=1, freq="1h")
+    with pytest.raises(tp.InvalidOptionError):
+        compute_indicators(data, cfg)
+    with pytest.raises(tp.InvalidOptionError):
+        get_indicators_many(data, [config("ema", period=5), cfg], cache=IndicatorCache())
+
+
+def test_flat_prices_do_not_warn(data):
+    flat = data.copy()
+    flat.iloc[:500] = 100.0
+    configs = [config("dx", HLC, period=14), config("di", HLC, period=14), config("adx", HLC, period=14)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        planned = IndicatorPlan(configs).compute_each(flat)
+    for series_dict, cfg in zip(planned, configs):
+        assert_columns_match(series_dict, compute_indicators(flat, cfg), 1e-12)
+
+
+def test_plan_shares_primitives():
+    plan = IndicatorPlan([
+        config("ema", period=20),
+        config("dema", period=20),
+        config("macd", short_period=10, long_period=20, signal_period=7),
+        config("di", HLC, period=14),
+        config("adx", HLC, period=14),
+        config("atr", HLC, period=14),
+    ])
+    kinds = [key[0] for key in plan.nodes]
+    assert sum(key[0] == "ema" and key[1] == ("input", "Close") and key[2] == 20 for key in plan.nodes) == 1
+    assert kinds.count("dm") == 1
+    assert kinds.count("tr") == 1
+
+
+def test_many_uses_cache_per_config(data):
+    cache = IndicatorCache()
+    first = get_indicators_many(data, EXACT[:3], cache=cache)
+    assert cache.stats()["misses"] == 3
+
+    configs = EXACT[:3] + [config("di", HLC, period=14), EXACT[0]]
+    second = get_indicators_many(data, configs, cache=cache)
+    assert cache.stats()["misses"] == 4
+    assert len(second) == len(configs)
+    for cached, fresh in zip(first, second):
+        assert_columns_match(cached, fresh, 0)
+    assert_columns_match(second[-1], second[0], 0)
+    assert_columns_match(second[3], IndicatorPlan([configs[3]]).compute(data), 0)
+
+    # get_indicators() reads the same entries.
+    assert_columns_match(get_indicators(data, configs[3], cache=cache), second[3], 0)
+    assert cache.stats()["misses"] == 4
@@ -0,0 +1,17 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+from benchmarks.synthetic import generate_ohlcv, random_signals
+from backtest_engine import backtest
+from monte_carlo import METHODS, monte_carlo
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_summary_stacks_with_observed(method):
+    # The app shows the quantiles with the observed metrics underneath; the
+    # combined frame has to go through Arrow for st.dataframe.
+    data = generate_ohlcv(2_000, seed=3, freq="1h")
+    result = monte_carlo(backtest(data, *random_signals(data.index, seed=3)), method=method, paths=200, seed=1)
+    table = pd.concat([result["summary"], pd.DataFrame(result["observed"], index=["observed"])])
+    assert table.index.tolist() == ["p05", "p25", "p50", "p75", "p95", "observed"]
+    pa.Table.from_pandas(table)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_ohlcv
+from portfolio import align_prices, portfolio_backtest
+
+
+def test_staggered_listing():
+    # B lists 100 bars after A; A's entry on bar 5 must go through and the
+    # equity must stay defined before B has a price.
+    a = generate_ohlcv(300, seed=1, freq="1D")
+    b = generate_ohlcv(300, seed=2, freq="1D").iloc[100:]
+    prices = align_prices({"A": a, "B": b})
+    n = len(prices)
+    longs = np.zeros((n, 2), dtype=bool)
+    exits = np.zeros((n, 2), dtype=bool)
+    longs[5, 0] = True
+    exits[50, 0] = True
+    longs[150, 1] = True
+    exits[200, 1] = True
+
+    result = portfolio_backtest(prices, longs, np.zeros((n, 2), dtype=bool), exits, position_size=0.5)
+
+    assert np.isfinite(result["equity"].to_numpy()).all()
+    assert np.isfinite(result["exposure"].to_numpy()).all()
+    trades = result["trades"]
+    assert list(trades["Ticker"]) == ["A", "B"]
+    assert trades["Entry Time"].iloc[0] == prices.index[5]
+    assert trades["Entry Time"].iloc[1] == prices.index[150]
+
+    # Until B lists, the portfolio is the same as trading A alone.
+    alone = portfolio_backtest(prices[["A"]], longs[:, :1], np.zeros((n, 1), dtype=bool), exits[:, :1], position_size=0.5)
+    np.testing.assert_array_equal(result["equity"].to_numpy()[:100], alone["equity"].to_numpy()[:100])
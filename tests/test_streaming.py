@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import generate_ohlcv
+from indicator_config import indicators_list
+from indicator_engine import compute_indicators
+from streaming import KERNELS, StreamingIndicator, StreamingStrategy
+from strategy_compiler import compile_expr
+from backtest_engine import backtest
+
+
+CONFIGS = [config for config in indicators_list if config["name"] in KERNELS] + [
+    {"name": "tr", "inputs": ["High", "Low", "Close"], "params": {}},
+    {"name": "macd", "inputs": ["Close"], "params": {"short_period": 10, "long_period": 24, "signal_period": 7}},
+    {"name": "bbands", "inputs": ["Close"], "params": {"period": 10, "stddev": 1.5}},
+]
+
+
+@pytest.fixture(scope="module")
+def data():
+    return generate_ohlcv(2_000, seed=5, freq="1h")
+
+
+def expected_columns(data, config):
+    # compute_indicators() output padded to the full index, as the streaming
+    # kernels emit NaN during warm-up.
+    return {col: series.reindex(data.index).to_numpy() for col, series in compute_indicators(data, config).items()}
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=lambda config: f"{config['name']}{list(config['params'].values())}")
+def test_replay_matches_compute_indicators(data, config):
+    expected = expected_columns(data, config)
+
+    indicator = StreamingIndicator(config)
+    rows = [indicator.update(bar) for bar in data.to_dict("records")]
+    for col, values in expected.items():
+        np.testing.assert_array_equal(np.array([row[col] for row in rows]), values)
+
+    # The same kernels stepped a block at a time, split mid-warm-up.
+    indicator = StreamingIndicator(config)
+    bounds = [0, 7, 707, 1407, len(data)]
+    blocks = [indicator.run(data.iloc[start:stop]) for start, stop in zip(bounds, bounds[1:])]
+    for col, values in expected.items():
+        np.testing.assert_array_equal(np.concatenate([block[col] for block in blocks]), values)
+
+
+def test_strategy_replay_matches_backtest(data):
+    config = {"name": "sma", "inputs": ["Close"], "params": {"period": 20}}
+    exprs = ("(df['Close'] > df['SMA_20'])", "(df['Close'] < df['SMA_20'])", "(df['Close'] < df['Open'])")
+    strategy = StreamingStrategy([config], *exprs, stop_loss_pct=0.3)
+    equity = [strategy.update(bar, timestamp)["equity"] for timestamp, bar in zip(data.index, data.to_dict("records"))]
+
+    frame = data.assign(**compute_indicators(data, config))
+    signals = [compile_expr(expr)(frame) for expr in exprs]
+    np.testing.assert_array_equal(np.asarray(equity), backtest(frame, *signals, stop_loss_pct=0.3, lean=True)["equity"])
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from data_fetcher import fetch_data, INTERVAL_DELTAS
+from indicator_engine import get_indicators_many, data_fingerprint
+from profiling import timed, count
+
+
+# pandas resample arguments per interval. Bars are labelled with the start of
+# their bin, as downloaded bars are, and bins are anchored on midnight (Monday
+# for weeks) so every finer level nests inside the coarser ones.
+RESAMPLE_RULES = {
+    "1m": {"rule": "1min"},
+    "2m": {"rule": "2min"},
+    "5m": {"rule": "5min"},
+    "15m": {"rule": "15min"},
+    "30m": {"rule": "30min"},
+    "60m": {"rule": "60min"},
+    "90m": {"rule": "90min"},
+    "1h": {"rule": "1h"},
+    "1d": {"rule": "1D"},
+    "1wk": {"rule": "W-MON", "closed": "left", "label": "left"},
+}
+
+TIMEFRAME_DELTAS = {**INTERVAL_DELTAS, "1wk": pd.Timedelta(weeks=1)}
+
+OHLCV_AGGREGATION = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def resample_ohlcv(data, interval):
+    if interval not in RESAMPLE_RULES:
+        raise ValueError(f"Cannot resample to '{interval}' (supported: {', '.join(RESAMPLE_RULES)})")
+    aggregation = {col: how for col, how in OHLCV_AGGREGATION.items() if col in data.columns}
+    bars = data[list(aggregation)].resample(**RESAMPLE_RULES[interval]).agg(aggregation)
+    # Bins with no bars underneath (nights, weekends, holidays) are dropped.
+    return bars[bars["Close"].notna()]
+
+
+def align_to_base(base_index, base_interval, values, interval):
+    # Maps columns computed on `interval` bars onto the base bars. A bar's
+    # values only become visible once it has closed, i.e. on the first base
+    # bar whose own close is at or after the end of the higher-timeframe bar,
+    # so nothing from a bar that is still forming leaks into earlier rows.
+    base_end = base_index + TIMEFRAME_DELTAS[base_interval]
+    bar_end = values.index + TIMEFRAME_DELTAS[interval]
+    position = np.searchsorted(bar_end.asi8, base_end.asi8, side="right") - 1
+    visible = position >= 0
+    aligned = {}
+    for col in values.columns:
+        column = values[col].to_numpy(dtype=np.float64)
+        out = np.full(len(base_index), np.nan)
+        out[visible] = column[position[visible]]
+        aligned[col] = pd.Series(out, index=base_index)
+    return aligned
+
+
+class TimeframePyramid:
+    # OHLCV bars at several intervals built from one fetch of the finest one.
+    # Each level is resampled from the coarsest level already built that
+    # nests inside it (1h from 15m rather than from 1m) and kept for reuse.
+    def __init__(self, base, base_interval):
+        if base_interval not in TIMEFRAME_DELTAS:
+            raise ValueError(f"Unknown base interval '{base_interval}'")
+        self.base = base
+        self.base_interval = base_interval
+        self.levels = {base_interval: base}
+        self.fingerprints = {}
+
+    def bars(self, interval):
+        if interval in self.levels:
+            return self.levels[interval]
+        target = TIMEFRAME_DELTAS.get(interval)
+        if target is None or interval not in RESAMPLE_RULES:
+            raise ValueError(f"Cannot resample to '{interval}' (supported: {', '.join(RESAMPLE_RULES)})")
+        if target < TIMEFRAME_DELTAS[self.base_interval]:
+            raise ValueError(f"'{interval}' is finer than the base interval '{self.base_interval}'")
+
+        sources = [level for level in self.levels if target % TIMEFRAME_DELTAS[level] == pd.Timedelta(0)]
+        source = max(sources, key=lambda level: TIMEFRAME_DELTAS[level])
+        with timed("timeframes.resample"):
+            bars = resample_ohlcv(self.levels[source], interval)
+        count("timeframes.levels_built")
+        self.levels[interval] = bars
+        return bars
+
+    def indicator_columns(self, interval, configs):
+        # Indicator columns computed on `interval` bars and aligned back to the
+        # base bars, named "<column>@<interval>" (e.g. SMA_20@1h) so strategy
+        # conditions can refer to them next to the base columns.
+        bars = self.bars(interval)
+        if interval not in self.fingerprints:
+            self.fingerprints[interval] = data_fingerprint(bars)
+        columns = {}
+        for outputs in get_indicators_many(bars, configs, fingerprint=self.fingerprints[interval]):
+            columns.update(outputs)
+        if interval == self.base_interval:
+            return columns
+        frame = pd.DataFrame(columns, index=bars.index)
+        frame["Close"] = bars["Close"]
+        aligned = align_to_base(self.base.index, self.base_interval, frame, interval)
+        return {f"{col}@{interval}": series for col, series in aligned.items()}
+
+
+def fetch_pyramid(ticker, period, base_interval, provider=None, cache=None):
+    # One download (or cache read) of the base interval; every coarser
+    # timeframe is derived from it instead of being fetched separately.
+    base = fetch_data(ticker, period, base_interval, provider=provider, cache=cache)
+    if base is None or base.empty:
+        return None
+    return TimeframePyramid(base, base_interval)
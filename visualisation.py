@@ -1,10 +1,18 @@
 import plotly.graph_objects as go
-import plotly.express as px
+import pandas as pd
+import numpy as np
 
 
-def plot_equity_curve(equity_curve):
+# Roughly two points per horizontal pixel of a wide chart; series longer than
+# this are decimated and drawn with WebGL.
+MAX_POINTS = 2000
+
+
+def plot_equity_curve(equity_curve, max_points=MAX_POINTS, method='lttb', bands=None):
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=equity_curve.index, y=equity_curve, mode='lines', name='Equity'))
+    if bands is not None and not bands.empty:
+        add_percentile_bands(fig, bands, max_points)
+    fig.add_trace(line_trace(equity_curve.index, equity_curve, 'Equity', max_points, method))
     fig.update_layout(
         title='Equity Curve',
         xaxis_title='Date',
@@ -14,21 +22,49 @@ def plot_equity_curve(equity_curve):
     return fig
 
 
-def plot_all_indicators(df, trades=None):
+def add_percentile_bands(fig, bands, max_points=MAX_POINTS):
+    # bands: one column per percentile (e.g. monte_carlo()['bands']). Columns
+    # are paired from the outside in (5-95, 25-75) into shaded areas and a
+    # middle column, if any, is drawn as a dashed median. Every column is
+    # thinned at the same rows so the areas stay closed.
+    rows = np.arange(len(bands))
+    if max_points is not None and len(bands) > max_points:
+        rows = np.unique(np.linspace(0, len(bands) - 1, max_points).astype(np.int64))
+    x = bands.index[rows]
+    columns = list(bands.columns)
+    for i in range(len(columns) // 2):
+        low, high = columns[i], columns[-1 - i]
+        opacity = 0.15 + 0.15 * i
+        fig.add_trace(go.Scatter(x=x, y=bands[low].to_numpy()[rows], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=x, y=bands[high].to_numpy()[rows], mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=f'rgba(99, 110, 250, {opacity:.2f})', name=f'P{low}-P{high}'))
+    if len(columns) % 2:
+        middle = columns[len(columns) // 2]
+        fig.add_trace(go.Scatter(x=x, y=bands[middle].to_numpy()[rows], mode='lines', name=f'P{middle}', line=dict(color='rgb(99, 110, 250)', dash='dash')))
+    return fig
+
+
+def plot_all_indicators(df, trades=None, max_points=MAX_POINTS, method='lttb'):
     fig = go.Figure()
 
     if 'Close' in df.columns:
-        fig.add_trace(go.Scatter(x=df.index, y=df['Close'], mode='lines', name='Close', line=dict(color='blue')))
+        fig.add_trace(line_trace(df.index, df['Close'], 'Close', max_points, method, line=dict(color='blue')))
 
     for col in df.columns:
         if col not in ['Open', 'High', 'Low', 'Close', 'Volume']:
-            fig.add_trace(go.Scatter(x=df.index, y=df[col], mode='lines', name=col))
+            fig.add_trace(line_trace(df.index, df[col], col, max_points, method))
 
     if trades is not None and not trades.empty:
-        for _, row in trades.iterrows():
-            color = 'green' if row['Type'] == 'Long' else 'red'
-            fig.add_vline(x=row['Entry Time'], line=dict(color=color, width=1, dash='dot'))
-            fig.add_vline(x=row['Exit Time'], line=dict(color='gray', width=1, dash='dot'))
+        if not isinstance(trades, pd.DataFrame):
+            trades = trades.to_frame()
+        # One marker trace per side instead of a shape per trade, which keeps
+        # the figure small and fast with thousands of trades.
+        marker_trace = go.Scattergl if len(trades) > (max_points or MAX_POINTS) // 2 else go.Scatter
+        for side, symbol, color in [('Long', 'triangle-up', 'green'), ('Short', 'triangle-down', 'red')]:
+            entries = trades[trades['Type'] == side]
+            if not entries.empty:
+                fig.add_trace(marker_trace(x=entries['Entry Time'], y=entries['Entry Price'], mode='markers', name=f'{side} Entry', marker=dict(symbol=symbol, color=color, size=8)))
+        fig.add_trace(marker_trace(x=trades['Exit Time'], y=trades['Exit Price'], mode='markers', name='Exit', marker=dict(symbol='x', color='gray', size=7)))
 
     fig.update_layout(
         title='Close Price & Indicators with Trade Markers',
@@ -41,14 +77,102 @@ def plot_all_indicators(df, trades=None):
     return fig
 
 
-def plot_pnl_histogram(trades_df):
-    if trades_df.empty:
+def plot_pnl_histogram(trade_pnls):
+    if len(trade_pnls) == 0:
         return None
 
-    fig = px.histogram(trades_df, x='PnL', nbins=20, title='PnL Histogram')
+    fig = go.Figure(go.Histogram(x=np.asarray(trade_pnls), nbinsx=20, name='PnL'))
     fig.update_layout(
+        title='PnL Histogram',
         xaxis_title='Profit / Loss per Trade',
         yaxis_title='Frequency',
         template='plotly_white'
     )
     return fig
+
+
+def plot_param_heatmap(results, x, y, metric='total_return'):
+    grid = results.pivot_table(index=y, columns=x, values=metric, aggfunc='max')
+    fig = go.Figure(go.Heatmap(
+        z=grid.values,
+        x=grid.columns,
+        y=grid.index,
+        colorscale='RdYlGn',
+        colorbar=dict(title=metric)
+    ))
+    fig.update_layout(
+        title=f'{metric} by {x} and {y}',
+        xaxis_title=x,
+        yaxis_title=y,
+        template='plotly_white'
+    )
+    return fig
+
+
+def line_trace(x, y, name, max_points=MAX_POINTS, method='lttb', **kwargs):
+    # Full-resolution SVG line for short series; otherwise a WebGL line
+    # through the points picked by `method` ('lttb' or 'minmax').
+    y = np.asarray(y, dtype=np.float64)
+    if max_points is None or len(y) <= max_points:
+        return go.Scatter(x=x, y=y, mode='lines', name=name, **kwargs)
+
+    idx = downsample_indices(y, max_points, method)
+    return go.Scattergl(x=np.asarray(x)[idx], y=y[idx], mode='lines', name=name, **kwargs)
+
+
+def downsample_indices(y, max_points, method='lttb'):
+    # Indices (into y) of at most max_points finite points to draw.
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(y))
+    if len(valid) <= max_points:
+        return valid
+    if method == 'lttb':
+        picked = lttb_indices(valid.astype(np.float64), y[valid], max_points)
+    elif method == 'minmax':
+        picked = minmax_indices(y[valid], max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method '{method}', expected 'lttb' or 'minmax'")
+    return valid[picked]
+
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, from
+    # each of threshold - 2 equal buckets in between, the point forming the
+    # largest triangle with the previous pick and the next bucket's mean.
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    picked = np.empty(threshold, dtype=np.intp)
+    picked[0] = 0
+    picked[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x = x[end:next_end].mean()
+        mean_y = y[end:next_end].mean()
+        area = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def minmax_indices(y, max_points):
+    # Min and max of each of (max_points - 2) // 2 equal buckets plus both
+    # endpoints, in index order.
+    n = len(y)
+    buckets = max((max_points - 2) // 2, 1)
+    if 2 * buckets >= n:
+        return np.arange(n)
+
+    width = -(-n // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    lows = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    picked = np.unique(np.concatenate([[0, n - 1], lows, highs]))
+    return picked[picked < n]